@@ -0,0 +1,35 @@
+"""Group broadcasts encoded once per event.
+
+The sender serializes the client-facing message to JSON once and puts the
+ready text in the channel layer event. Receiving consumers forward
+`event['text']` as-is, so a broadcast to N sockets costs one serialization,
+not N.
+"""
+import json
+from typing import Optional
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+
+
+def encode_event(message: dict, handler: Optional[str] = None) -> dict:
+    """Channel layer event for `message`; `handler` is the consumer method (default: message['type'])"""
+    return {
+        'type': handler or message['type'],
+        'text': json.dumps(message),
+    }
+
+
+async def group_send(group: str, message: dict, handler: Optional[str] = None):
+    await get_channel_layer().group_send(group, encode_event(message, handler))
+
+
+def group_send_sync(group: str, message: dict, handler: Optional[str] = None):
+    """group_send for sync code (views, database_sync_to_async helpers)"""
+    async_to_sync(get_channel_layer().group_send)(group, encode_event(message, handler))
+
+
+class ForwardEventMixin:
+    """Consumer mixin: sends pre-encoded group events without re-serializing them"""
+
+    async def forward(self, event: dict):
+        await self.send(text_data=event['text'])
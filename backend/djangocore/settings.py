@@ -143,6 +143,29 @@ CHANNEL_LAYERS = {
     },
 }
 
+# Tryb zapisu walk zawomons: 'actions' (pełna historia BattleAction) lub 'replay' (seed + wybory ruchów)
+BATTLE_STORAGE_MODE = os.environ.get('BATTLE_STORAGE_MODE', 'actions')
+
+# Czas na wybór ruchów w turze (sekundy); po nim niegotowi gracze dostają domyślne ruchy. 0 wyłącza
+BATTLE_TURN_TIMEOUT = float(os.environ.get('BATTLE_TURN_TIMEOUT', '60'))
+
+# Co ile tur wiadomości walki niosą pełny snapshot stanu obok delty
+BATTLE_SNAPSHOT_INTERVAL = int(os.environ.get('BATTLE_SNAPSHOT_INTERVAL', '10'))
+
+# Kolejka ranked: szerokość przedziału ratingu i co ile sekund czekania szukamy o przedział dalej
+MATCHMAKING_RATING_BAND = int(os.environ.get('MATCHMAKING_RATING_BAND', '100'))
+MATCHMAKING_WIDEN_AFTER = float(os.environ.get('MATCHMAKING_WIDEN_AFTER', '10'))
+
+# Współczynnik K rankingu Elo (maksymalna zmiana ratingu po jednej walce ranked)
+RANKED_ELO_K_FACTOR = int(os.environ.get('RANKED_ELO_K_FACTOR', '32'))
+
+# Sprzątanie porzuconych walk (sekundy): walka 'waiting' bez przeciwnika i walka 'selection'
+# starsze niż podany czas są zamykane; BATTLE_REAPER_INTERVAL > 0 włącza sprzątanie w procesie serwera
+BATTLE_WAITING_TTL = float(os.environ.get('BATTLE_WAITING_TTL', '1800'))
+BATTLE_SELECTION_TTL = float(os.environ.get('BATTLE_SELECTION_TTL', '86400'))
+BATTLE_REAPER_INTERVAL = float(os.environ.get('BATTLE_REAPER_INTERVAL', '0'))
+BATTLE_REAPER_BATCH_SIZE = int(os.environ.get('BATTLE_REAPER_BATCH_SIZE', '500'))
+
 # For production with Redis, use:
 # CHANNEL_LAYERS = {
 #     'default': {
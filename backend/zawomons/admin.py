@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Player, Creature, Spell, City, Battle, BattleParticipant, BattleAction, GameInvitation
+from .models import Player, PlayerRating, Creature, Spell, City, Battle, BattleParticipant, BattleAction, BattleTurnRecord, GameInvitation
 
 @admin.register(Player)
 class PlayerAdmin(admin.ModelAdmin):
@@ -7,6 +7,11 @@ class PlayerAdmin(admin.ModelAdmin):
     list_filter = ('last_played', 'created_at')
     search_fields = ('user__username',)
 
+@admin.register(PlayerRating)
+class PlayerRatingAdmin(admin.ModelAdmin):
+    list_display = ('player', 'rating', 'games_played', 'wins', 'losses', 'draws', 'updated_at')
+    search_fields = ('player__user__username',)
+
 @admin.register(Creature)
 class CreatureAdmin(admin.ModelAdmin):
     list_display = ('name', 'owner', 'main_element', 'secondary_element', 'experience', 'current_hp', 'posX', 'posY')
@@ -43,6 +48,11 @@ class BattleActionAdmin(admin.ModelAdmin):
     list_filter = ('action_type', 'battle__battle_type')
     search_fields = ('caster__creature__name', 'target__creature__name')
 
+@admin.register(BattleTurnRecord)
+class BattleTurnRecordAdmin(admin.ModelAdmin):
+    list_display = ('battle', 'turn_number')
+    search_fields = ('battle__id',)
+
 @admin.register(GameInvitation)
 class GameInvitationAdmin(admin.ModelAdmin):
     list_display = ('id', 'sender', 'receiver', 'invitation_type', 'status', 'created_at', 'expires_at')
@@ -0,0 +1,403 @@
+import asyncio
+import logging
+from typing import Dict, List, Optional
+from channels.db import database_sync_to_async
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from .models import Battle, BattleParticipant, BattleAction
+from .battle_engine import BattleEngine
+from .battle_state import BattleState, get_battle_state, find_battle_state, drop_battle_state
+from .spell_effects import get_spell_effect
+from .turn_deadlines import TurnDeadlineScheduler
+from .wire import encoded_event
+
+logger = logging.getLogger(__name__)
+
+
+class BattleActorError(Exception):
+    """Błąd wiadomości gracza - wysyłany do klienta jako 'error'"""
+
+
+def parse_id(value, name: str) -> int:
+    """Id z wiadomości klienta (liczba albo liczbowy string, jak przy dawnych zapytaniach ORM)"""
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise BattleActorError(f"Invalid {name}")
+
+
+class BattleActor:
+    """Aktor walki: jedno zadanie asyncio z kolejką wiadomości od obu graczy.
+
+    Wiadomości są przetwarzane po kolei, więc np. dwa jednoczesne confirm_ready
+    nie wykonają tury dwa razy. Każda wiadomość to jeden skok do wątku z bazą.
+    """
+
+    def __init__(self, battle_id: str):
+        self.battle_id = str(battle_id)
+        self.group_name = f"battle_{self.battle_id}"
+        self.inbox: asyncio.Queue = asyncio.Queue()
+        self.finished = False
+        self.state_loaded = False  # stan załadowany z bazy w ostatniej wiadomości - trzeba ustawić termin tury
+        self.task: Optional[asyncio.Task] = None
+
+    def start(self):
+        self.task = asyncio.get_running_loop().create_task(self.run())
+
+    def stop(self):
+        """Kończy pracę aktora po bieżącej wiadomości; kolejne dostają 'Battle already finished'"""
+        self.finished = True
+        self.tell('stop')
+
+    async def ask(self, message_type: str, player, data: Optional[dict] = None):
+        """Wrzuca wiadomość do kolejki aktora i czeka na jej obsłużenie"""
+        future = asyncio.get_running_loop().create_future()
+        await self.inbox.put((message_type, player, data or {}, future))
+        return await future
+
+    def tell(self, message_type: str, player=None, data: Optional[dict] = None):
+        """Wrzuca wiadomość do kolejki bez czekania na odpowiedź"""
+        self.inbox.put_nowait((message_type, player, data or {}, None))
+
+    async def run(self):
+        try:
+            while not self.finished:
+                message_type, player, data, future = await self.inbox.get()
+                handler = getattr(self, f'handle_{message_type}', None)
+                try:
+                    if handler is None:
+                        raise BattleActorError(f"Unknown battle message: {message_type}")
+                    result = await handler(player, data)
+                except Exception as e:
+                    if future is None:
+                        logger.exception(f"Battle {self.battle_id}: {message_type} failed")
+                    elif not future.done():
+                        future.set_exception(e)
+                else:
+                    if future is not None and not future.done():
+                        future.set_result(result)
+                self.arm_loaded_state()
+        finally:
+            if _actors.get(self.battle_id) is self:
+                del _actors[self.battle_id]
+            # Wiadomości, które przyszły po końcu walki
+            while not self.inbox.empty():
+                _, _, _, future = self.inbox.get_nowait()
+                if future is not None and not future.done():
+                    future.set_exception(BattleActorError("Battle already finished"))
+
+    # Obsługa wiadomości
+    async def handle_select_move(self, player, data) -> dict:
+        return await database_sync_to_async(self.select_move)(
+            player, data.get('creature_id'), data.get('spell_id'), data.get('target_id')
+        )
+
+    async def handle_confirm_ready(self, player, data):
+        event = await database_sync_to_async(self.confirm_ready)(player)
+        await self.broadcast(event)
+
+    async def handle_turn_timeout(self, player, data):
+        event = await database_sync_to_async(self.resolve_turn_timeout)(data.get('turn'))
+        if event is not None:
+            await self.broadcast(event)
+
+    async def handle_stop(self, player, data):
+        pass  # tylko budzi pętlę czekającą na wiadomość
+
+    async def handle_start_turn_clock(self, player, data):
+        state = find_battle_state(self.battle_id) or await database_sync_to_async(self.get_state)()
+        if turn_deadlines.deadline(self.battle_id) is None:
+            schedule_turn_deadline(self.battle_id, state.current_turn)
+
+    async def handle_sync_request(self, player, data) -> dict:
+        state = find_battle_state(self.battle_id) or await database_sync_to_async(self.get_state)()
+        return self.sync_message(state, data.get('since_seq'))
+
+    async def handle_resume_battle(self, player, data) -> dict:
+        state = find_battle_state(self.battle_id) or await database_sync_to_async(self.get_state)()
+        if not any(p.player_id == player.id for p in state.participants.values()):
+            raise BattleActorError("Not a participant of this battle")
+        return self.resume_message(state, player.id)
+
+    async def handle_spectate_battle(self, player, data) -> dict:
+        state = find_battle_state(self.battle_id) or await database_sync_to_async(self.get_state)()
+        return {
+            'type': 'spectating',
+            'battle_id': self.battle_id,
+            'turn_number': state.current_turn,
+            'seq': state.current_turn,
+            'participants': state.participants_data()
+        }
+
+    def arm_loaded_state(self):
+        """Termin bieżącej tury dla walki, którą aktor właśnie załadował z bazy.
+
+        Nowe walki dostają termin od start_turn_clock; to dotyczy walk wczytanych
+        po restarcie serwera (terminy w pamięci przepadły razem z procesem).
+        """
+        if not self.state_loaded:
+            return
+        self.state_loaded = False
+        state = find_battle_state(self.battle_id)
+        if state is not None and not self.finished and turn_deadlines.deadline(self.battle_id) is None:
+            schedule_turn_deadline(self.battle_id, state.current_turn)
+
+    async def broadcast(self, event: dict):
+        """Wysyła zdarzenie do grupy walki (zakodowane raz) i ustawia termin następnej tury"""
+        state = find_battle_state(self.battle_id)
+        roster = state.roster_index() if state else None
+        await get_channel_layer().group_send(self.group_name, encoded_event(event, roster))
+        if event['type'] == 'turn_results':
+            schedule_turn_deadline(self.battle_id, state.current_turn)
+        elif event['type'] == 'battle_ended':
+            turn_deadlines.cancel(self.battle_id)
+            drop_battle_state(self.battle_id)
+
+    # Praca na bazie (wykonywana w wątku, jeden skok na wiadomość)
+    def get_battle(self) -> Battle:
+        try:
+            battle = Battle.objects.get(id=self.battle_id)
+        except (Battle.DoesNotExist, ValidationError):
+            self.finished = True
+            raise BattleActorError("Battle not found")
+        if battle.phase == 'finished':
+            self.finished = True
+            raise BattleActorError("Battle already finished")
+        return battle
+
+    def get_state(self) -> BattleState:
+        """Stan walki z pamięci; ładowany z bazy tylko gdy walka nie jest jeszcze w pamięci"""
+        state = find_battle_state(self.battle_id)
+        if state is None:
+            battle = self.get_battle()
+            if battle.phase == 'waiting':
+                raise BattleActorError("Battle has not started yet")
+            state = get_battle_state(battle)
+            self.state_loaded = True
+        return state
+
+    def select_move(self, player, creature_id, spell_id, target_id) -> dict:
+        """Walidacja ruchu w pamięci i zapis wyboru jednym UPDATE"""
+        creature_id = parse_id(creature_id, 'creature_id')
+        spell_id = parse_id(spell_id, 'spell_id')
+        target_id = parse_id(target_id, 'target_id') if target_id not in (None, '') else None
+
+        state = self.get_state()
+        participant = state.find_participant(creature_id, player.id)
+        if participant is None:
+            raise BattleActorError("Creature is not in this battle")
+
+        # Sprawdź czy creature zna ten spell
+        if not state.knows_spell(participant.participant_id, spell_id):
+            raise BattleActorError("Creature doesn't know this spell")
+
+        # Ustaw wybór (cel jest opcjonalny, ale wskazany musi być w tej walce)
+        selection = {'selected_spell_id': spell_id}
+        target_participant_id = None
+        if target_id is not None:
+            target_participant_id = state.creature_participants.get(target_id)
+            if target_participant_id is None:
+                raise BattleActorError("Target is not in this battle")
+            selection['selected_target_id'] = target_participant_id
+        BattleParticipant.objects.filter(id=participant.participant_id).update(**selection)
+        state.select_move(participant.participant_id, spell_id, target_participant_id)
+
+        return {
+            'type': 'move_selected',
+            'creature_id': creature_id,
+            'spell_id': spell_id,
+            'target_id': target_id
+        }
+
+    def confirm_ready(self, player) -> dict:
+        """Potwierdza gotowość gracza; gdy obie drużyny są gotowe wykonuje turę"""
+        state = self.get_state()
+
+        # Oznacz żywe creatures gracza z wybranym spellem jako gotowe - jeden warunkowy UPDATE
+        BattleParticipant.objects.filter(
+            battle_id=self.battle_id,
+            player=player,
+            selected_spell__isnull=False,
+            current_hp__gt=0
+        ).update(has_confirmed_move=True)
+        state.confirm_player(player.id)
+
+        # Gotowość drużyn ze stanu w pamięci
+        team1_ready = state.team_ready(1)
+        team2_ready = state.team_ready(2)
+
+        if not (team1_ready and team2_ready):
+            return {
+                'type': 'player_ready',
+                'player_id': player.id,
+                'team1_ready': team1_ready,
+                'team2_ready': team2_ready
+            }
+
+        return self.execute_turn(self.get_battle(), state)
+
+    def resolve_turn_timeout(self, turn: Optional[int] = None) -> Optional[dict]:
+        """Minął termin tury: niegotowe creatures dostają domyślny ruch i tura wykonuje się od razu.
+
+        Termin tury, która wykonała się zanim timeout doszedł do kolejki aktora, jest ignorowany (None).
+        """
+        battle = self.get_battle()
+        state = get_battle_state(battle)
+        if turn is not None and state.current_turn != turn:
+            return None
+
+        for participant in state.participants.values():
+            if not participant.is_alive or participant.has_confirmed_move:
+                continue
+            spell_pk = participant.selected_spell_id or state.default_spell(participant.participant_id)
+            if spell_pk:
+                participant.selected_spell_id = spell_pk
+                participant.has_confirmed_move = True
+
+        return self.execute_turn(battle, state)
+
+    def execute_turn(self, battle: Battle, state: BattleState) -> dict:
+        """Wykonuje turę i zwraca wiadomość z wynikami dla grupy walki"""
+        turn = BattleEngine.execute_turn(battle)
+        actions_data = self.serialize_actions(state, turn.actions)
+
+        # Delta stanu pod numerem sekwencji, co BATTLE_SNAPSHOT_INTERVAL tur także pełny snapshot
+        sync = {'seq': state.current_turn, 'delta': state.record_delta()}
+        if state.current_turn % settings.BATTLE_SNAPSHOT_INTERVAL == 0:
+            sync['snapshot'] = state.snapshot()
+
+        if turn.winner:
+            # Zastosuj wyniki walki
+            BattleEngine.apply_battle_results(battle, turn.winner)
+            self.finished = True
+            return {
+                'type': 'battle_ended',
+                'winner': turn.winner,
+                'actions': actions_data,
+                **sync
+            }
+
+        return {
+            'type': 'turn_results',
+            'turn_number': turn.turn_number,
+            'actions': actions_data,
+            **sync
+        }
+
+    def resume_message(self, state: BattleState, player_id: int) -> dict:
+        """Pełny stan walki dla gracza wracającego po zerwaniu połączenia (z pamięci, bez zapytań)"""
+        selections = []
+        for participant in state.participants.values():
+            if participant.player_id == player_id and participant.selected_spell_id:
+                target = state.get(participant.selected_target_id)
+                selections.append({
+                    'creature_id': participant.creature_id,
+                    'spell_id': participant.selected_spell_id,
+                    'target_id': target.creature_id if target else None,
+                    'confirmed': participant.has_confirmed_move
+                })
+
+        deadline = turn_deadlines.deadline(self.battle_id)
+        return {
+            'type': 'battle_resumed',
+            'battle_id': self.battle_id,
+            'turn_number': state.current_turn,
+            'seq': state.current_turn,
+            'participants': state.participants_data(),
+            'selections': selections,
+            'turn_time_left': max(0.0, deadline - asyncio.get_running_loop().time()) if deadline else None
+        }
+
+    @staticmethod
+    def sync_message(state: BattleState, since_seq=None) -> dict:
+        """Odpowiedź na sync_request: brakujące delty, a gdy ich już nie ma - pełny snapshot"""
+        deltas = state.deltas_since(since_seq) if isinstance(since_seq, int) else None
+        message = {'type': 'state_sync', 'seq': state.current_turn}
+        if deltas is None:
+            message['snapshot'] = state.snapshot()
+        else:
+            message['deltas'] = deltas
+        return message
+
+    @staticmethod
+    def serialize_actions(state: BattleState, actions: List[BattleAction]) -> List[dict]:
+        """Dane akcji dla klienta (creatures i spelle z pamięci, bez zapytań)"""
+        actions_data = []
+        for action in actions:
+            caster = state.get(action.caster_id)
+            spell = get_spell_effect(action.spell_used_id)
+            action_data = {
+                'action_type': action.action_type,
+                'caster': {
+                    'creature_id': caster.creature_id,
+                    'name': caster.name
+                },
+                'spell_name': spell.name if spell else None,
+                'damage_amount': action.damage_amount,
+                'heal_amount': action.heal_amount,
+            }
+
+            target = state.get(action.target_id)
+            if target:
+                action_data['target'] = {
+                    'creature_id': target.creature_id,
+                    'name': target.name,
+                    'hp_after': action.target_hp_after,
+                    'alive_after': action.target_alive_after
+                }
+
+            actions_data.append(action_data)
+        return actions_data
+
+
+# Aktorzy walk w tym procesie (battle_id -> BattleActor)
+_actors: Dict[str, BattleActor] = {}
+
+
+def _on_turn_deadline(battle_id: str, turn: Optional[int]):
+    get_battle_actor(battle_id).tell('turn_timeout', data={'turn': turn})
+
+
+# Jeden harmonogram terminów tur dla wszystkich walk w procesie
+turn_deadlines = TurnDeadlineScheduler(_on_turn_deadline)
+
+
+def schedule_turn_deadline(battle_id, turn: Optional[int] = None):
+    """Ustawia termin tury `turn` walki (BATTLE_TURN_TIMEOUT = 0 wyłącza terminy)"""
+    if settings.BATTLE_TURN_TIMEOUT > 0:
+        turn_deadlines.schedule(battle_id, settings.BATTLE_TURN_TIMEOUT, turn)
+
+
+async def start_turn_clock(battle_id):
+    """Ustawia termin pierwszej tury właśnie rozpoczętej walki, bez czekania na wiadomość gracza.
+
+    Kod sync (widoki REST) wywołuje ją przez async_to_sync - w pętli serwera, w której żyją aktorzy.
+    """
+    get_battle_actor(battle_id).tell('start_turn_clock')
+
+
+async def close_abandoned_battle(battle_id):
+    """Walka zamknięta bez zwycięzcy poza aktorem (reaper): ogłasza koniec grupie i zatrzymuje aktora"""
+    key = str(battle_id)
+    turn_deadlines.cancel(key)
+    drop_battle_state(key)
+    await get_channel_layer().group_send(f"battle_{key}", encoded_event({
+        'type': 'battle_ended',
+        'winner': None,
+        'reason': 'abandoned'
+    }))
+    actor = _actors.get(key)
+    if actor is not None:
+        actor.stop()
+
+
+def get_battle_actor(battle_id) -> BattleActor:
+    """Zwraca aktora walki, uruchamiając go przy pierwszym użyciu"""
+    key = str(battle_id)
+    actor = _actors.get(key)
+    if actor is None:
+        actor = BattleActor(key)
+        _actors[key] = actor
+        actor.start()
+    return actor
@@ -0,0 +1,251 @@
+"""Czysty rdzeń zasad walki - bez ORM, działa na zwykłych dataclassach.
+
+Warstwa Django (battle_state / battle_engine) tylko ładuje dane do tych
+struktur i zapisuje wyniki. Dzięki temu zasady można uruchamiać w pamięci:
+w symulatorach, AI i benchmarkach.
+"""
+import random
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+# Rodzaje efektów spelli
+EFFECT_DAMAGE = 'damage'
+EFFECT_HEAL = 'heal'
+
+# Tryby wyboru celu
+TARGET_SELF = 'self'
+TARGET_SINGLE_ENEMY = 'single_enemy'
+TARGET_ALL_ENEMIES = 'all_enemies'
+
+BASE_SPELL_DAMAGE = 25  # bazowy damage spella
+DAMAGE_VARIANCE = 0.2   # ±20%
+BASE_HEAL = 30
+HEAL_VARIANCE = 0.15    # ±15%
+
+
+@dataclass(slots=True)
+class ParticipantState:
+    """Kompaktowy stan uczestnika walki trzymany w pamięci procesu"""
+    participant_id: int
+    creature_id: int
+    player_id: int
+    team: int
+    name: str
+    max_hp: int
+    current_hp: int
+    current_energy: int
+    damage: int
+    initiative: int  # inicjatywa creature + initiative_bonus
+    experience: int
+    selected_spell_id: Optional[int] = None
+    selected_target_id: Optional[int] = None  # id BattleParticipant
+    has_confirmed_move: bool = False
+    player_name: str = ''
+
+    @property
+    def is_alive(self) -> bool:
+        return self.current_hp > 0
+
+
+@dataclass(frozen=True, slots=True)
+class SpellEffect:
+    """Skompilowany efekt spella - wszystko czego potrzeba do rozstrzygnięcia tury"""
+    spell_id: int  # klucz główny Spell (ten sam co selected_spell_id)
+    name: str
+    kind: str = EFFECT_DAMAGE
+    power: int = BASE_SPELL_DAMAGE
+    targeting: str = TARGET_SINGLE_ENEMY
+    energy_cost: int = 0
+
+
+@dataclass(slots=True)
+class ActionResult:
+    """Wynik pojedynczej akcji w turze (odpowiednik BattleAction bez ORM)"""
+    action_order: int
+    action_type: str
+    caster_id: int
+    target_id: int
+    spell_id: int
+    damage_amount: int = 0
+    heal_amount: int = 0
+    target_hp_after: Optional[int] = None
+    target_alive_after: bool = True
+
+
+def turn_rng(seed: int, turn_number: int) -> random.Random:
+    """Deterministyczny PRNG dla danej tury walki (ten sam seed + tura = te same rzuty)"""
+    return random.Random(f"{seed}:{turn_number}")
+
+
+def calculate_damage(caster: ParticipantState, target: ParticipantState, spell: SpellEffect, rng=random) -> int:
+    """Oblicza damage dla spell cast"""
+    total_damage = caster.damage + spell.power
+
+    # Dodaj losowość
+    variance = int(total_damage * DAMAGE_VARIANCE)
+    total_damage += rng.randint(-variance, variance)
+
+    return max(1, total_damage)  # minimum 1 damage
+
+
+def calculate_heal(caster: ParticipantState, target: ParticipantState, spell: SpellEffect, rng=random) -> int:
+    """Oblicza heal amount dla healing spell"""
+    variance = int(spell.power * HEAL_VARIANCE)
+    heal_amount = spell.power + rng.randint(-variance, variance)
+
+    # Nie może leczyć ponad max HP
+    actual_heal = min(heal_amount, target.max_hp - target.current_hp)
+
+    return max(0, actual_heal)
+
+
+def apply_damage(caster: ParticipantState, target: ParticipantState, spell: SpellEffect,
+                 result: 'ActionResult', rng=random):
+    damage = calculate_damage(caster, target, spell, rng)
+    target.current_hp = max(0, target.current_hp - damage)
+    result.damage_amount = damage
+    result.action_type = 'damage_dealt'
+
+
+def apply_heal(caster: ParticipantState, target: ParticipantState, spell: SpellEffect,
+               result: 'ActionResult', rng=random):
+    heal_amount = calculate_heal(caster, target, spell, rng)
+    target.current_hp = min(target.max_hp, target.current_hp + heal_amount)
+    result.heal_amount = heal_amount
+    result.action_type = 'heal_performed'
+
+
+# Dispatch: rodzaj efektu -> funkcja stosująca efekt
+EFFECT_HANDLERS = {
+    EFFECT_DAMAGE: apply_damage,
+    EFFECT_HEAL: apply_heal,
+}
+
+
+def turn_order_key(p: ParticipantState):
+    """Klucz sortowania: inicjatywa (malejąco), potem level, exp i nazwa dla determinizmu"""
+    return (-p.initiative, -p.experience // 100, -p.experience, p.name)
+
+
+def get_turn_order(participants: List[ParticipantState],
+                   order_keys: Optional[Dict[int, tuple]] = None) -> List[ParticipantState]:
+    """Zwraca kolejność uczestników na podstawie inicjatywy.
+
+    `order_keys` to wcześniej policzone klucze (participant_id -> turn_order_key),
+    np. trzymane w stanie walki - wtedy sortowanie nie liczy ich od nowa.
+    """
+    alive_with_spells = [
+        p for p in participants
+        if p.is_alive and p.selected_spell_id and p.has_confirmed_move
+    ]
+    if order_keys is None:
+        return sorted(alive_with_spells, key=turn_order_key)
+    return sorted(alive_with_spells, key=lambda p: order_keys[p.participant_id])
+
+
+def _target_self(caster: ParticipantState, participants: Dict[int, ParticipantState]) -> List[ParticipantState]:
+    return [caster]
+
+
+def _target_single_enemy(caster: ParticipantState, participants: Dict[int, ParticipantState]) -> List[ParticipantState]:
+    # Pierwszy żywy przeciwnik
+    for p in participants.values():
+        if p.team != caster.team and p.is_alive:
+            return [p]
+    return []
+
+
+def _target_all_enemies(caster: ParticipantState, participants: Dict[int, ParticipantState]) -> List[ParticipantState]:
+    return [p for p in participants.values() if p.team != caster.team and p.is_alive]
+
+
+# Dispatch: tryb wyboru celu -> funkcja zwracająca domyślne cele
+TARGET_SELECTORS = {
+    TARGET_SELF: _target_self,
+    TARGET_SINGLE_ENEMY: _target_single_enemy,
+    TARGET_ALL_ENEMIES: _target_all_enemies,
+}
+
+# Tryby, w których gracz może wskazać cel ręcznie
+SINGLE_TARGET_MODES = (TARGET_SELF, TARGET_SINGLE_ENEMY)
+
+
+def get_spell_targets(caster: ParticipantState, spell: SpellEffect,
+                      participants: Dict[int, ParticipantState]) -> List[ParticipantState]:
+    """Określa cele spella na podstawie trybu wyboru celu"""
+    if caster.selected_target_id is not None and spell.targeting in SINGLE_TARGET_MODES:
+        selected_target = participants.get(caster.selected_target_id)
+        if selected_target:
+            return [selected_target]
+
+    return TARGET_SELECTORS[spell.targeting](caster, participants)
+
+
+def count_alive(participants: Dict[int, ParticipantState]) -> Dict[int, int]:
+    """Liczba żywych uczestników w każdej drużynie"""
+    alive_counts = {1: 0, 2: 0}
+    for p in participants.values():
+        alive_counts.setdefault(p.team, 0)
+        if p.is_alive:
+            alive_counts[p.team] += 1
+    return alive_counts
+
+
+def battle_outcome(alive_counts: Dict[int, int]) -> Optional[str]:
+    """Zwraca zwycięzcę ('team1', 'team2', 'draw') albo None gdy walka trwa"""
+    team1_alive = alive_counts.get(1, 0) > 0
+    team2_alive = alive_counts.get(2, 0) > 0
+
+    if not team1_alive and not team2_alive:
+        return "draw"
+    elif not team1_alive:
+        return "team2"
+    elif not team2_alive:
+        return "team1"
+
+    return None  # walka trwa
+
+
+def resolve_turn(participants: Dict[int, ParticipantState], spells: Dict[int, SpellEffect],
+                 rng=random, order_keys: Optional[Dict[int, tuple]] = None,
+                 alive_counts: Optional[Dict[int, int]] = None) -> List[ActionResult]:
+    """Rozstrzyga jedną turę: modyfikuje HP uczestników w miejscu i zwraca listę akcji.
+
+    Jeśli podano `alive_counts` (drużyna -> liczba żywych), są one aktualizowane
+    przy każdej śmierci / wskrzeszeniu, więc koniec walki nie wymaga skanowania.
+    Nie resetuje wyboru ruchów - to należy do wywołującego.
+    """
+    results = []
+    action_counter = 0
+
+    for participant in get_turn_order(list(participants.values()), order_keys):
+        spell = spells.get(participant.selected_spell_id)
+        if not participant.is_alive or not spell:
+            continue
+
+        action_counter += 1
+
+        apply_effect = EFFECT_HANDLERS[spell.kind]
+
+        for target in get_spell_targets(participant, spell, participants):
+            result = ActionResult(
+                action_order=action_counter,
+                action_type='spell_cast',
+                caster_id=participant.participant_id,
+                target_id=target.participant_id,
+                spell_id=spell.spell_id,
+            )
+
+            # Oblicz i zastosuj efekt
+            was_alive = target.is_alive
+            apply_effect(participant, target, spell, result, rng)
+            if alive_counts is not None and was_alive != target.is_alive:
+                alive_counts[target.team] += 1 if target.is_alive else -1
+
+            # Stan po akcji
+            result.target_hp_after = target.current_hp
+            result.target_alive_after = target.is_alive
+
+            results.append(result)
+
+    return results
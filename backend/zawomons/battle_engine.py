@@ -1,260 +1,360 @@
+from dataclasses import asdict, dataclass
 from typing import List, Dict, Optional, Tuple
-import random
-from .models import Battle, BattleParticipant, BattleAction
-from .models import Creature, Spell
+from . import battle_core
+from .battle_core import ParticipantState
+from .models import Battle, BattleParticipant, BattleAction, BattleTurnRecord
+from .models import Creature, PlayerRating, Spell
+from .battle_state import BattleState, drop_battle_state, get_battle_state
+from .spell_effects import get_spell_effect, get_spell_effects
+from .open_battles import announce_closed, announce_opened
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, Value, When
 from django.utils import timezone
 
 
+@dataclass
+class TurnResult:
+    """Wynik wykonanej tury: akcje i stan walki po turze"""
+    turn_number: int
+    actions: List[BattleAction]
+    winner: Optional[str] = None  # 'team1', 'team2', 'draw' albo None gdy walka trwa
+    
+    @property
+    def is_finished(self) -> bool:
+        return self.winner is not None
+
+
 class BattleEngine:
     """Silnik walki - autorytatywne obliczenia po stronie serwera"""
     
     @staticmethod
-    def calculate_damage(caster: BattleParticipant, target: BattleParticipant, spell: Spell) -> int:
-        """Oblicza damage dla spell cast"""
-        base_damage = caster.creature.damage
+    def execute_turn(battle: Battle) -> TurnResult:
+        """Wykonuje jedną turę walki na stanie w pamięci i zwraca akcje oraz wynik walki"""
+        state = get_battle_state(battle)
+        participants = list(state.participants.values())
         
-        # Znajdź spell effect dla damage
-        spell_power = 0
-        # TODO: Po dodaniu spell effects do modeli, tutaj będzie prawdziwe obliczenie
-        # Na razie używamy prostej formuły
-        spell_power = 25  # bazowy damage spella
+        # Efekty wybranych spelli z rejestru procesu (bez zapytań o Spell)
+        spell_effects = {}
+        for p in participants:
+            effect = get_spell_effect(p.selected_spell_id)
+            if effect:
+                spell_effects[effect.spell_id] = effect
         
-        # Obliczenie finalnego damage
-        total_damage = base_damage + spell_power
+        # Uczestnicy, których wiersze trzeba zapisać (wybór ruchu lub zmiana HP)
+        touched_ids = {
+            p.participant_id for p in participants
+            if p.selected_spell_id or p.selected_target_id or p.has_confirmed_move
+        }
         
-        # Dodaj losowość (±20%)
-        variance = int(total_damage * 0.2)
-        total_damage += random.randint(-variance, variance)
+        # Potwierdzone wybory (dla trybu replay) i stan początkowy walki
+        selections = [
+            [p.participant_id, p.selected_spell_id, p.selected_target_id]
+            for p in participants if p.selected_spell_id and p.has_confirmed_move
+        ]
+        initial_state = None
+        if battle.storage_mode == 'replay' and state.current_turn == 0:
+            initial_state = [asdict(p) for p in participants]
         
-        return max(1, total_damage)  # minimum 1 damage
-    
-    @staticmethod
-    def calculate_heal(caster: BattleParticipant, target: BattleParticipant, spell: Spell) -> int:
-        """Oblicza heal amount dla healing spell"""
-        # TODO: Po dodaniu spell effects
-        base_heal = 30
-        variance = int(base_heal * 0.15)
-        heal_amount = base_heal + random.randint(-variance, variance)
+        # Rozstrzygnięcie tury w czystym rdzeniu (bez dostępu do bazy), z PRNG walki
+        rng = battle_core.turn_rng(battle.rng_seed, state.current_turn)
+        results = battle_core.resolve_turn(
+            state.participants, spell_effects, rng, state.order_keys, state.alive_counts
+        )
         
-        # Nie może leczyć ponad max HP
-        current_hp = target.current_hp
-        max_hp = target.creature.max_hp
-        actual_heal = min(heal_amount, max_hp - current_hp)
+        actions = []
+        for result in results:
+            actions.append(BattleAction(
+                battle=battle,
+                turn_number=state.current_turn,
+                action_order=result.action_order,
+                action_type=result.action_type,
+                caster_id=result.caster_id,
+                target_id=result.target_id,
+                spell_used_id=result.spell_id,
+                damage_amount=result.damage_amount,
+                heal_amount=result.heal_amount,
+                target_hp_after=result.target_hp_after,
+                target_alive_after=result.target_alive_after
+            ))
+            touched_ids.add(result.target_id)
         
-        return max(0, actual_heal)
+        # Reset wyboru ruchów na następną turę
+        turn_number = state.current_turn
+        state.reset_selections()
+        state.current_turn += 1
+        
+        try:
+            if battle.storage_mode == 'replay':
+                # Zamiast akcji zapisujemy tylko wybory ruchów - akcje da się odtworzyć z seeda
+                turn_record = BattleTurnRecord(battle=battle, turn_number=turn_number, selections=selections)
+                BattleEngine.commit_turn(battle, state, [], touched_ids, turn_record, initial_state)
+            else:
+                BattleEngine.commit_turn(battle, state, actions, touched_ids)
+        except Exception:
+            # Stan w pamięci jest już po turze, a baza nie - następna wiadomość wczyta walkę z bazy
+            drop_battle_state(battle.id)
+            raise
+        
+        return TurnResult(turn_number=turn_number, actions=actions, winner=state.winner)
     
     @staticmethod
-    def get_turn_order(participants: List[BattleParticipant]) -> List[BattleParticipant]:
-        """Zwraca kolejność uczestników na podstawie inicjatywy"""
-        alive_with_spells = [
-            p for p in participants 
-            if p.is_alive and p.selected_spell and p.has_confirmed_move
-        ]
+    def commit_turn(battle: Battle, state: BattleState, actions: List[BattleAction], touched_ids=None,
+                    turn_record: Optional[BattleTurnRecord] = None, initial_state: Optional[List[dict]] = None):
+        """Zapisuje wynik tury do bazy: jeden bulk_create akcji, jeden bulk_update uczestników, jedna transakcja"""
+        if touched_ids is None:
+            touched_ids = state.participants.keys()
         
-        # Sortuj po inicjatywie (malejąco), potem po levelu, exp i nazwie dla determinizmu
-        return sorted(
-            alive_with_spells,
-            key=lambda p: (
-                -p.total_initiative,
-                -p.creature.level if hasattr(p.creature, 'level') else -p.creature.experience // 100,
-                -p.creature.experience,
-                p.creature.name
-            )
-        )
+        updated_participants = []
+        for participant_id in touched_ids:
+            p = state.participants[participant_id]
+            updated_participants.append(BattleParticipant(
+                id=p.participant_id,
+                current_hp=p.current_hp,
+                current_energy=p.current_energy,
+                selected_spell_id=p.selected_spell_id,
+                selected_target_id=p.selected_target_id,
+                has_confirmed_move=p.has_confirmed_move
+            ))
+        
+        with transaction.atomic():
+            if actions:
+                BattleAction.objects.bulk_create(actions)
+            
+            if updated_participants:
+                BattleParticipant.objects.bulk_update(updated_participants, [
+                    'current_hp', 'current_energy', 'selected_spell',
+                    'selected_target', 'has_confirmed_move'
+                ])
+            
+            if turn_record is not None:
+                turn_record.save()
+            
+            battle_fields = {'current_turn': state.current_turn}
+            if initial_state is not None:
+                battle_fields['initial_state'] = initial_state
+            Battle.objects.filter(id=battle.id).update(**battle_fields)
+        
+        for field, value in battle_fields.items():
+            setattr(battle, field, value)
     
     @staticmethod
-    def execute_turn(battle: Battle) -> List[BattleAction]:
-        """Wykonuje jedną turę walki i zwraca listę akcji"""
-        participants = list(battle.participants.all())
-        turn_order = BattleEngine.get_turn_order(participants)
+    def replay_battle(battle: Battle) -> Tuple[List[BattleAction], Dict[int, ParticipantState]]:
+        """Odtwarza akcje walki w trybie replay z seeda i zapisanych wyborów ruchów.
         
-        actions = []
-        action_counter = 0
+        Zwraca (niezapisane) akcje oraz końcowy stan uczestników.
+        """
+        participants = {
+            p['participant_id']: ParticipantState(**p) for p in (battle.initial_state or [])
+        }
+        order_keys = {pid: battle_core.turn_order_key(p) for pid, p in participants.items()}
+        records = list(battle.turn_records.all())
         
-        for participant in turn_order:
-            if not participant.is_alive or not participant.selected_spell:
-                continue
-                
-            spell = participant.selected_spell
-            action_counter += 1
-            
-            # Określ cele na podstawie typu spella
-            # TODO: Po dodaniu spell effects, tutaj będzie prawdziwe określanie celów
-            targets = BattleEngine._get_spell_targets(participant, spell, participants)
+        spell_effects = get_spell_effects()
+        
+        actions = []
+        for record in records:
+            for participant in participants.values():
+                participant.selected_spell_id = None
+                participant.selected_target_id = None
+                participant.has_confirmed_move = False
+            for participant_id, spell_id, target_id in record.selections:
+                participant = participants[participant_id]
+                participant.selected_spell_id = spell_id
+                participant.selected_target_id = target_id
+                participant.has_confirmed_move = True
             
-            for target in targets:
-                # Utwórz akcję spellcast
-                action = BattleAction.objects.create(
+            rng = battle_core.turn_rng(battle.rng_seed, record.turn_number)
+            for result in battle_core.resolve_turn(participants, spell_effects, rng, order_keys):
+                actions.append(BattleAction(
                     battle=battle,
-                    turn_number=battle.current_turn,
-                    action_order=action_counter,
-                    action_type='spell_cast',
-                    caster=participant,
-                    target=target,
-                    spell_used=spell
-                )
-                
-                # Oblicz i zastosuj efekt
-                if spell.name.lower() in ['heal', 'cure', 'restore']:  # TODO: proper spell effect detection
-                    heal_amount = BattleEngine.calculate_heal(participant, target, spell)
-                    target.current_hp = min(target.creature.max_hp, target.current_hp + heal_amount)
-                    action.heal_amount = heal_amount
-                    action.action_type = 'heal_performed'
-                else:
-                    # Domyślnie damage
-                    damage = BattleEngine.calculate_damage(participant, target, spell)
-                    target.current_hp = max(0, target.current_hp - damage)
-                    action.damage_amount = damage
-                    action.action_type = 'damage_dealt'
-                
-                # Zapisz stan po akcji
-                action.target_hp_after = target.current_hp
-                action.target_alive_after = target.is_alive
-                target.save()
-                action.save()
-                
-                actions.append(action)
+                    turn_number=record.turn_number,
+                    action_order=result.action_order,
+                    action_type=result.action_type,
+                    caster_id=result.caster_id,
+                    target_id=result.target_id,
+                    spell_used_id=result.spell_id,
+                    damage_amount=result.damage_amount,
+                    heal_amount=result.heal_amount,
+                    target_hp_after=result.target_hp_after,
+                    target_alive_after=result.target_alive_after
+                ))
         
-        # Reset wyboru ruchów na następną turę
-        for participant in participants:
-            participant.reset_move_selection()
+        return actions, participants
+    
+    @staticmethod
+    def get_battle_actions(battle: Battle) -> List[BattleAction]:
+        """Zwraca historię akcji walki niezależnie od trybu zapisu"""
+        if battle.storage_mode != 'replay':
+            return list(battle.actions.select_related(
+                'caster__creature', 'target__creature', 'spell_used'
+            ).order_by('turn_number', 'action_order', 'id'))
         
-        battle.current_turn += 1
-        battle.save()
+        actions, _ = BattleEngine.replay_battle(battle)
         
+        # Podepnij uczestników i spelle z bazy (po jednym zapytaniu) dla serializerów
+        participants = battle.participants.select_related('creature').in_bulk()
+        spells = Spell.objects.in_bulk({action.spell_used_id for action in actions})
+        for action in actions:
+            action.caster = participants[action.caster_id]
+            action.target = participants.get(action.target_id)
+            action.spell_used = spells.get(action.spell_used_id)
         return actions
     
     @staticmethod
-    def _get_spell_targets(caster: BattleParticipant, spell: Spell, all_participants: List[BattleParticipant]) -> List[BattleParticipant]:
-        """Określa cele spella na podstawie jego typu"""
-        # TODO: Po dodaniu spell effects system, tutaj będzie prawdziwe określanie
-        # Na razie proste określanie na podstawie nazwy i wybranego target
-        
-        if caster.selected_target:
-            return [caster.selected_target]
+    def verify_battle(battle: Battle) -> bool:
+        """Sprawdza czy odtworzona walka daje ten sam stan HP co zapisany w bazie"""
+        if battle.storage_mode != 'replay':
+            return True
         
-        # Jeśli nie wybrano konkretnego celu, użyj domyślnej logiki
-        if spell.name.lower() in ['heal', 'cure', 'restore']:
-            # Leczenie - cel to sam siebie
-            return [caster]
-        else:
-            # Atak - pierwszy żywy przeciwnik
-            enemies = [p for p in all_participants if p.team != caster.team and p.is_alive]
-            if enemies:
-                return [enemies[0]]
-            return []
+        _, replayed = BattleEngine.replay_battle(battle)
+        stored = dict(battle.participants.values_list('id', 'current_hp'))
+        return all(stored.get(pid) == p.current_hp for pid, p in replayed.items())
+    
+    @staticmethod
+    def apply_battle_results(battle: Battle, winner_team: str):
+        """Stosuje efekty zakończonej walki (EXP, HP i rating tylko dla ranked battles) i zamyka walkę"""
+        with transaction.atomic():
+            if battle.battle_type == 'ranked':
+                BattleEngine._settle_creatures(battle, winner_team)
+                BattleEngine._update_ratings(battle, winner_team)
+            
+            battle.phase = 'finished'
+            battle.finished_at = timezone.now()
+            
+            # Ustaw zwycięzcę
+            if winner_team == "team1":
+                battle.winner_id = battle.player1_id
+            elif winner_team == "team2":
+                battle.winner_id = battle.player2_id
+            
+            battle.save(update_fields=['phase', 'finished_at', 'winner'])
     
     @staticmethod
-    def check_battle_end(battle: Battle) -> Optional[str]:
-        """Sprawdza czy walka się skończyła i zwraca zwycięzcę"""
-        participants = list(battle.participants.all())
+    def _settle_creatures(battle: Battle, winner_team: str):
+        """Jednym UPDATE dodaje EXP i przepisuje HP po walce wszystkim creatures uczestników"""
+        participants = get_battle_state(battle).participants.values()
+        if not participants:
+            return
         
-        team1_alive = any(p.is_alive for p in participants if p.team == 1)
-        team2_alive = any(p.is_alive for p in participants if p.team == 2)
+        # Zwycięzca dostaje więcej EXP, więcej exp za dłuższe walki
+        win_exp = 50 + (battle.current_turn * 5)
+        lose_exp = 10 + (battle.current_turn * 2)
+        winner_ids = [p.creature_id for p in participants if winner_team == f"team{p.team}"]
         
-        if not team1_alive and not team2_alive:
-            return "draw"
-        elif not team1_alive:
-            return "team2"
-        elif not team2_alive:
-            return "team1"
+        # Jeśli creature "umarło" w walce, zostaw mu 1 HP
+        hp_cases = [When(id=p.creature_id, then=Value(max(1, p.current_hp))) for p in participants]
         
-        return None  # walka trwa
+        Creature.objects.filter(id__in=[p.creature_id for p in participants]).update(
+            experience=F('experience') + Case(
+                When(id__in=winner_ids, then=Value(win_exp)),
+                default=Value(lose_exp)
+            ),
+            current_hp=Case(*hp_cases, default=F('current_hp')),
+            updated_at=timezone.now()
+        )
     
     @staticmethod
-    def apply_battle_results(battle: Battle, winner_team: str):
-        """Stosuje efekty zakończonej walki (tylko dla ranked battles)"""
-        if battle.battle_type != 'ranked':
-            return  # friendly battles nie mają konsekwencji
+    def _update_ratings(battle: Battle, winner_team: str):
+        """Przelicza rating Elo obu graczy (stałą liczbą zapytań, wiersze zablokowane do końca transakcji)"""
+        player_ids = [battle.player1_id, battle.player2_id]
+        if None in player_ids:
+            return
         
-        participants = list(battle.participants.all())
+        # Pierwsza walka ranked gracza tworzy mu wiersz z ratingiem startowym
+        PlayerRating.objects.bulk_create([PlayerRating(player_id=pid) for pid in player_ids], ignore_conflicts=True)
+        ratings = {r.player_id: r for r in PlayerRating.objects.select_for_update().filter(player_id__in=player_ids)}
+        first, second = ratings[battle.player1_id], ratings[battle.player2_id]
         
-        for participant in participants:
-            creature = participant.creature
-            
-            if winner_team == f"team{participant.team}":
-                # Zwycięzca dostaje EXP
-                exp_gain = 50 + (battle.current_turn * 5)  # więcej exp za dłuższe walki
-                creature.experience += exp_gain
-            else:
-                # Przegrany dostaje mniej EXP
-                exp_gain = 10 + (battle.current_turn * 2)
-                creature.experience += exp_gain
-            
-            # Zaktualizuj HP do stanu po walce (tylko ranked battles)
-            if battle.battle_type == 'ranked':
-                creature.current_hp = participant.current_hp
-                
-                # Jeśli creature "umarło" w walce, zostaw mu 1 HP
-                if creature.current_hp <= 0:
-                    creature.current_hp = 1
-            
-            creature.save()
-        
-        battle.phase = 'finished'
-        battle.finished_at = timezone.now()
+        # Wynik gracza 1: 1 wygrana, 0.5 remis, 0 przegrana
+        score = {'team1': 1.0, 'team2': 0.0}.get(winner_team, 0.5)
+        expected = 1 / (1 + 10 ** ((second.rating - first.rating) / 400))
+        change = round(settings.RANKED_ELO_K_FACTOR * (score - expected))
+        first.rating += change
+        second.rating -= change
         
-        # Ustaw zwycięzcę
-        if winner_team == "team1":
-            battle.winner = battle.player1
-        elif winner_team == "team2":
-            battle.winner = battle.player2
+        now = timezone.now()
+        for rating, result in ((first, score), (second, 1.0 - score)):
+            rating.games_played += 1
+            if result == 1.0:
+                rating.wins += 1
+            elif result == 0.0:
+                rating.losses += 1
+            else:
+                rating.draws += 1
+            rating.updated_at = now
         
-        battle.save()
+        PlayerRating.objects.bulk_update(
+            [first, second], ['rating', 'games_played', 'wins', 'losses', 'draws', 'updated_at']
+        )
 
 
 class BattleMatchmaker:
     """Zarządza tworzeniem i dołączaniem do walk"""
     
     @staticmethod
-    def create_battle(player1, battle_type: str = 'friendly') -> Battle:
+    def create_battle(player1, battle_type: str = 'friendly', storage_mode: Optional[str] = None) -> Battle:
         """Tworzy nową walkę"""
         battle = Battle.objects.create(
             player1=player1,
             battle_type=battle_type,
-            phase='waiting'
+            phase='waiting',
+            storage_mode=storage_mode or settings.BATTLE_STORAGE_MODE
         )
+        transaction.on_commit(lambda: announce_opened(battle))
         return battle
     
+    @staticmethod
+    def cancel_battle(battle: Battle, player1) -> bool:
+        """Zamyka porzuconą walkę, do której nikt jeszcze nie dołączył (tylko jej twórca)"""
+        cancelled = Battle.objects.filter(
+            id=battle.id, player1=player1, phase='waiting', player2__isnull=True
+        ).update(phase='finished', finished_at=timezone.now())
+        if not cancelled:
+            return False  # ktoś już dołączył albo walka nie jest otwarta
+        
+        transaction.on_commit(lambda: announce_closed(battle.id))
+        battle.phase = 'finished'
+        return True
+    
     @staticmethod
     def join_battle(battle: Battle, player2, team1_creatures: List[int], team2_creatures: List[int]) -> bool:
-        """Dołącza drugiego gracza do walki z wybranymi creatures"""
-        if battle.player2 is not None:
+        """Dołącza drugiego gracza do walki z wybranymi creatures (stała liczba zapytań niezależnie od drużyn)"""
+        if battle.player2_id is not None:
             return False  # battle już pełny
         
+        started_at = timezone.now()
+        with transaction.atomic():
+            # Warunkowy UPDATE zajmuje miejsce drugiego gracza - z dwóch równoczesnych joinów wygrywa jeden,
+            # a walka anulowana albo zamknięta przez reaper (finished bez player2) zostaje zamknięta
+            joined = Battle.objects.filter(id=battle.id, phase='waiting', player2__isnull=True).update(
+                player2=player2,
+                phase='selection',
+                started_at=started_at
+            )
+            if not joined:
+                return False  # ktoś dołączył przed nami albo walka nie jest już otwarta
+            
+            # Creatures obu drużyn jednym zapytaniem; creatures innych właścicieli są pomijane
+            creatures = Creature.objects.in_bulk(list(team1_creatures) + list(team2_creatures))
+            participants = []
+            for team, player_id, creature_ids in ((1, battle.player1_id, team1_creatures), (2, player2.id, team2_creatures)):
+                for creature_id in creature_ids:
+                    creature = creatures.get(int(creature_id))
+                    if creature is None or creature.owner_id != player_id:
+                        continue
+                    participants.append(BattleParticipant(
+                        battle=battle,
+                        player_id=player_id,
+                        creature=creature,
+                        current_hp=creature.current_hp,
+                        current_energy=creature.current_energy,
+                        team=team
+                    ))
+            BattleParticipant.objects.bulk_create(participants)
+            transaction.on_commit(lambda: announce_closed(battle.id))
+        
         battle.player2 = player2
         battle.phase = 'selection'
-        battle.started_at = timezone.now()
-        battle.save()
-        
-        # Dodaj creatures team 1 (player1)
-        for creature_id in team1_creatures:
-            try:
-                creature = Creature.objects.get(id=creature_id, owner__user=battle.player1.user)
-                BattleParticipant.objects.create(
-                    battle=battle,
-                    player=battle.player1,
-                    creature=creature,
-                    current_hp=creature.current_hp,
-                    current_energy=creature.current_energy,
-                    team=1
-                )
-            except Creature.DoesNotExist:
-                continue
-        
-        # Dodaj creatures team 2 (player2)
-        for creature_id in team2_creatures:
-            try:
-                creature = Creature.objects.get(id=creature_id, owner__user=player2.user)
-                BattleParticipant.objects.create(
-                    battle=battle,
-                    player=player2,
-                    creature=creature,
-                    current_hp=creature.current_hp,
-                    current_energy=creature.current_energy,
-                    team=2
-                )
-            except Creature.DoesNotExist:
-                continue
-        
+        battle.started_at = started_at
         return True
\ No newline at end of file
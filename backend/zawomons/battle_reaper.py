@@ -0,0 +1,111 @@
+"""Sprzątanie porzuconych walk.
+
+Walka 'waiting', do której nikt nie dołączył przez BATTLE_WAITING_TTL, i walka
+'selection' starsza niż BATTLE_SELECTION_TTL (np. utracona przy restarcie
+serwera) są zamykane (phase='finished' bez zwycięzcy i bez skutków ranked).
+Kandydaci są wybierani po indeksie (phase, created_at) w partiach po
+BATTLE_REAPER_BATCH_SIZE, więc jedno przejście nie blokuje tabeli na długo.
+
+Uruchamiane komendą `manage.py reap_stale_battles` albo, gdy
+BATTLE_REAPER_INTERVAL > 0, okresowo w procesie serwera WebSocket. Tylko w tym
+drugim przypadku zmiany od razu widzi lista otwartych walk i stan walk
+w pamięci procesu, a gracze zamkniętej walki dostają battle_ended bez
+zwycięzcy (komenda działa w osobnym procesie).
+"""
+import asyncio
+import logging
+from datetime import timedelta
+from typing import Dict, List, Optional
+
+from channels.db import database_sync_to_async
+from django.conf import settings
+from django.utils import timezone
+
+from .battle_actor import close_abandoned_battle
+from .models import Battle
+from .open_battles import announce_closed
+
+logger = logging.getLogger(__name__)
+
+
+def reap_phase(phase: str, ttl: float, batch_size: int, max_batches: Optional[int] = None) -> List[str]:
+    """Zamyka walki w fazie `phase` starsze niż `ttl` sekund, partiami; zwraca id zamkniętych walk"""
+    cutoff = timezone.now() - timedelta(seconds=ttl)
+    reaped: List[str] = []
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        battle_ids = list(
+            Battle.objects.filter(phase=phase, created_at__lt=cutoff)
+            .order_by('created_at')
+            .values_list('id', flat=True)[:batch_size]
+        )
+        if not battle_ids:
+            break
+        full_batch = len(battle_ids) == batch_size
+
+        # Warunek na fazę - walka, która w międzyczasie ruszyła albo się skończyła, zostaje nietknięta
+        finished_at = timezone.now()
+        closed = Battle.objects.filter(id__in=battle_ids, phase=phase).update(
+            phase='finished',
+            finished_at=finished_at
+        )
+        batches += 1
+        if closed < len(battle_ids):
+            battle_ids = list(
+                Battle.objects.filter(id__in=battle_ids, phase='finished', finished_at=finished_at)
+                .values_list('id', flat=True)
+            )
+        reaped.extend(str(battle_id) for battle_id in battle_ids)
+
+        if phase == 'waiting':
+            for battle_id in battle_ids:
+                announce_closed(battle_id)
+
+        if not full_batch:
+            break
+    return reaped
+
+
+def reap_stale_battles(batch_size: Optional[int] = None, max_batches: Optional[int] = None,
+                       waiting_ttl: Optional[float] = None, selection_ttl: Optional[float] = None) -> Dict[str, List[str]]:
+    """Zamyka porzucone walki obu faz; zwraca id zamkniętych walk na fazę"""
+    batch_size = batch_size or settings.BATTLE_REAPER_BATCH_SIZE
+    return {
+        'waiting': reap_phase(
+            'waiting', settings.BATTLE_WAITING_TTL if waiting_ttl is None else waiting_ttl,
+            batch_size, max_batches
+        ),
+        'selection': reap_phase(
+            'selection', settings.BATTLE_SELECTION_TTL if selection_ttl is None else selection_ttl,
+            batch_size, max_batches
+        ),
+    }
+
+
+_reaper_task: Optional[asyncio.Task] = None
+
+
+async def _run_reaper():
+    while True:
+        await asyncio.sleep(settings.BATTLE_REAPER_INTERVAL)
+        try:
+            reaped = await database_sync_to_async(reap_stale_battles)()
+        except Exception:
+            logger.exception("Stale battle reaper failed")
+            continue
+
+        # Terminy tur, stan w pamięci i aktorów zmieniamy w pętli asyncio, nie w wątku bazy;
+        # gracze i widzowie walki dostają battle_ended bez zwycięzcy
+        for battle_id in reaped['selection']:
+            await close_abandoned_battle(battle_id)
+        if any(reaped.values()):
+            logger.info(f"Reaped stale battles: {len(reaped['waiting'])} waiting, {len(reaped['selection'])} in selection")
+
+
+def start_battle_reaper():
+    """Uruchamia okresowe sprzątanie w pętli asyncio serwera (raz na proces, gdy BATTLE_REAPER_INTERVAL > 0)"""
+    global _reaper_task
+    if settings.BATTLE_REAPER_INTERVAL <= 0:
+        return
+    if _reaper_task is None or _reaper_task.done():
+        _reaper_task = asyncio.get_running_loop().create_task(_run_reaper())
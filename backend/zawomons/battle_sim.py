@@ -0,0 +1,136 @@
+"""Wektorowy symulator Monte Carlo walk (NumPy) do balansowania elementów i spelli.
+
+Symuluje tysiące walk naraz: stan każdej walki to wiersz macierzy HP
+(walka x slot w drużynie). Zasady odpowiadają battle_core: ta sama kolejność
+tury, ten sam wybór celu, te same wzory na damage i heal.
+"""
+from dataclasses import asdict, dataclass
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from .battle_core import (
+    DAMAGE_VARIANCE, HEAL_VARIANCE, EFFECT_DAMAGE, EFFECT_HEAL,
+    TARGET_ALL_ENEMIES, TARGET_SELF, TARGET_SINGLE_ENEMY,
+    ParticipantState, SpellEffect, turn_order_key,
+)
+
+ONGOING, TEAM1, TEAM2, DRAW = 0, 1, 2, 3
+
+# Kombinacje (rodzaj efektu, tryb celu) obsługiwane przez symulator
+SUPPORTED_EFFECTS = {
+    (EFFECT_HEAL, TARGET_SELF),
+    (EFFECT_DAMAGE, TARGET_SINGLE_ENEMY),
+    (EFFECT_DAMAGE, TARGET_ALL_ENEMIES),
+}
+
+
+@dataclass(slots=True)
+class SimulationResult:
+    """Zbiorcze statystyki symulacji"""
+    battles: int
+    team1_wins: int
+    team2_wins: int
+    draws: int
+    unfinished: int  # walki, które nie skończyły się w max_turns
+    average_turns: float  # średnia długość zakończonych walk
+
+    @property
+    def team1_win_rate(self) -> float:
+        return self.team1_wins / self.battles if self.battles else 0.0
+
+    @property
+    def team2_win_rate(self) -> float:
+        return self.team2_wins / self.battles if self.battles else 0.0
+
+    def as_dict(self) -> dict:
+        data = asdict(self)
+        data['team1_win_rate'] = self.team1_win_rate
+        data['team2_win_rate'] = self.team2_win_rate
+        return data
+
+
+def simulate_battles(participants: List[ParticipantState], spells: Dict[int, SpellEffect],
+                     battles: int = 1000, max_turns: int = 100,
+                     seed: Optional[int] = None) -> SimulationResult:
+    """Symuluje `battles` walk dla podanych składów drużyn.
+
+    Każdy uczestnik co turę rzuca swój `selected_spell_id` w domyślne cele
+    efektu (bez ręcznie wybranego celu). Kolejność uczestników na liście
+    odpowiada kolejności uczestników walki w bazie.
+    """
+    rng = np.random.default_rng(seed)
+    n = battles
+
+    team = np.array([p.team for p in participants])
+    max_hp = np.array([p.max_hp for p in participants], dtype=np.int64)
+    hp = np.tile(np.array([p.current_hp for p in participants], dtype=np.int64), (n, 1))
+
+    # Kolejność tury nie zależy od losowania - liczymy ją raz dla wszystkich walk
+    order = [
+        i for i, p in sorted(enumerate(participants), key=lambda item: turn_order_key(item[1]))
+        if p.selected_spell_id in spells
+    ]
+    for i in order:
+        spell = spells[participants[i].selected_spell_id]
+        if (spell.kind, spell.targeting) not in SUPPORTED_EFFECTS:
+            raise ValueError(f'Unsupported spell effect for simulation: {spell.name} ({spell.kind}, {spell.targeting})')
+    enemies = {i: np.flatnonzero(team != team[i]) for i in order}
+
+    active = np.ones(n, dtype=bool)
+    turns = np.zeros(n, dtype=np.int64)
+    outcome = np.full(n, ONGOING, dtype=np.int8)
+
+    for _ in range(max_turns):
+        for i in order:
+            caster = participants[i]
+            acting = active & (hp[:, i] > 0)
+            spell = spells[caster.selected_spell_id]
+
+            if spell.kind == EFFECT_HEAL:
+                variance = int(spell.power * HEAL_VARIANCE)
+                roll = rng.integers(-variance, variance + 1, n)
+                amount = np.maximum(0, np.minimum(spell.power + roll, max_hp[i] - hp[:, i]))
+                hp[:, i] = np.where(acting, np.minimum(max_hp[i], hp[:, i] + amount), hp[:, i])
+                continue
+
+            enemy_slots = enemies[i]
+            if not len(enemy_slots):
+                continue
+            total_damage = caster.damage + spell.power
+            variance = int(total_damage * DAMAGE_VARIANCE)
+            alive_enemies = hp[:, enemy_slots] > 0
+
+            if spell.targeting == TARGET_ALL_ENEMIES:
+                # Każdy żywy przeciwnik dostaje osobny rzut na damage
+                hit = acting[:, None] & alive_enemies
+                damage = np.maximum(1, total_damage + rng.integers(-variance, variance + 1, hit.shape))
+                hp[:, enemy_slots] = np.where(hit, np.maximum(0, hp[:, enemy_slots] - damage), hp[:, enemy_slots])
+            else:
+                rows = np.flatnonzero(acting & alive_enemies.any(axis=1))
+                targets = enemy_slots[alive_enemies[rows].argmax(axis=1)]
+                damage = np.maximum(1, total_damage + rng.integers(-variance, variance + 1, len(rows)))
+                hp[rows, targets] = np.maximum(0, hp[rows, targets] - damage)
+
+        turns[active] += 1
+
+        team1_alive = (hp[:, team == 1] > 0).any(axis=1)
+        team2_alive = (hp[:, team == 2] > 0).any(axis=1)
+        ended = active & ~(team1_alive & team2_alive)
+        outcome[ended & team1_alive] = TEAM1
+        outcome[ended & team2_alive] = TEAM2
+        outcome[ended & ~team1_alive & ~team2_alive] = DRAW
+        active &= ~ended
+
+        if not active.any():
+            break
+
+    finished = outcome != ONGOING
+    return SimulationResult(
+        battles=n,
+        team1_wins=int((outcome == TEAM1).sum()),
+        team2_wins=int((outcome == TEAM2).sum()),
+        draws=int((outcome == DRAW).sum()),
+        unfinished=int((~finished).sum()),
+        average_turns=float(turns[finished].mean()) if finished.any() else 0.0,
+    )
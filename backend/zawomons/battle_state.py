@@ -0,0 +1,182 @@
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple
+from .models import Battle, CreatureSpell
+from .battle_core import ParticipantState, battle_outcome, count_alive, turn_order_key
+
+# Ile ostatnich delt stanu trzymamy dla klientów, które zgubiły wiadomości
+DELTA_HISTORY = 32
+
+
+class BattleState:
+    """Stan trwającej walki - źródło prawdy w trakcie tury, zapisywany do bazy raz na turę"""
+
+    __slots__ = ('battle_id', 'current_turn', 'participants', 'order_keys', 'alive_counts',
+                 'known_spells', 'creature_participants', 'synced', 'deltas')
+
+    def __init__(self, battle_id: str, current_turn: int, participants: List[ParticipantState],
+                 known_spells: Optional[Dict[int, Tuple[int, ...]]] = None):
+        self.battle_id = battle_id
+        self.current_turn = current_turn
+        # kolejność wstawiania = kolejność id, tak jak przy ładowaniu z bazy
+        self.participants: Dict[int, ParticipantState] = {p.participant_id: p for p in participants}
+        # Statystyki kolejności nie zmieniają się w trakcie walki - klucze liczymy raz
+        self.order_keys: Dict[int, tuple] = {p.participant_id: turn_order_key(p) for p in participants}
+        # Liczba żywych w drużynach - aktualizowana przyrostowo w trakcie tury
+        self.alive_counts: Dict[int, int] = count_alive(self.participants)
+        # Do walidacji ruchów w pamięci: spelle znane przez uczestnika (po Spell.spell_id,
+        # pierwszy to ruch domyślny) i cele po creature_id
+        self.known_spells: Dict[int, Tuple[int, ...]] = known_spells or {}
+        self.creature_participants: Dict[int, int] = {p.creature_id: p.participant_id for p in participants}
+        # Synchronizacja klientów: numer sekwencji = current_turn, delta po każdej turze
+        self.synced: Dict[int, list] = {p.participant_id: self.sync_row(p) for p in participants}
+        self.deltas: Deque[Tuple[int, list]] = deque(maxlen=DELTA_HISTORY)
+
+    @classmethod
+    def from_battle(cls, battle: Battle) -> 'BattleState':
+        """Ładuje stan walki z bazy (jedno zapytanie o graf uczestników, jedno o znane spelle)"""
+        participants = []
+        for p in battle.participants.select_related('creature', 'player__user').order_by('id'):
+            participants.append(ParticipantState(
+                participant_id=p.id,
+                creature_id=p.creature_id,
+                player_id=p.player_id,
+                team=p.team,
+                name=p.creature.name,
+                max_hp=p.creature.max_hp,
+                current_hp=p.current_hp,
+                current_energy=p.current_energy,
+                damage=p.creature.damage,
+                initiative=p.creature.initiative + p.initiative_bonus,
+                experience=p.creature.experience,
+                selected_spell_id=p.selected_spell_id,
+                selected_target_id=p.selected_target_id,
+                has_confirmed_move=p.has_confirmed_move,
+                player_name=p.player.user.username,
+            ))
+
+        spells_by_creature: Dict[int, list] = {p.creature_id: [] for p in participants}
+        known = CreatureSpell.objects.filter(creature_id__in=spells_by_creature).order_by('spell__spell_id')
+        for creature_id, spell_pk in known.values_list('creature_id', 'spell_id'):
+            spells_by_creature[creature_id].append(spell_pk)
+        known_spells = {p.participant_id: tuple(spells_by_creature[p.creature_id]) for p in participants}
+
+        return cls(str(battle.id), battle.current_turn, participants, known_spells)
+
+    @property
+    def winner(self) -> Optional[str]:
+        """Zwycięzca ('team1', 'team2', 'draw') albo None gdy walka trwa"""
+        return battle_outcome(self.alive_counts)
+
+    def participants_data(self) -> List[dict]:
+        """Dane uczestników dla klienta (battle_started, resume, spectate); initiative z bonusem walki"""
+        return [
+            {
+                'creature_id': p.creature_id,
+                'name': p.name,
+                'max_hp': p.max_hp,
+                'current_hp': p.current_hp,
+                'initiative': p.initiative,
+                'team': p.team,
+                'player_name': p.player_name
+            }
+            for p in self.participants.values()
+        ]
+
+    def roster_index(self) -> Dict[int, int]:
+        """creature_id -> pozycja uczestnika (kolejność participants_data)"""
+        return {p.creature_id: index for index, p in enumerate(self.participants.values())}
+
+    def get(self, participant_id: Optional[int]) -> Optional[ParticipantState]:
+        if participant_id is None:
+            return None
+        return self.participants.get(participant_id)
+
+    def find_participant(self, creature_id, player_id: int) -> Optional[ParticipantState]:
+        """Uczestnik walki po creature_id, o ile należy do podanego gracza"""
+        participant = self.get(self.creature_participants.get(creature_id))
+        if participant is None or participant.player_id != player_id:
+            return None
+        return participant
+
+    def knows_spell(self, participant_id: int, spell_id) -> bool:
+        return spell_id in self.known_spells.get(participant_id, ())
+
+    def default_spell(self, participant_id: int) -> Optional[int]:
+        """Ruch domyślny: Basic Attack (spell_id 0), a bez niego pierwszy znany spell"""
+        known = self.known_spells.get(participant_id)
+        return known[0] if known else None
+
+    def select_move(self, participant_id: int, spell_id: int, target_id: Optional[int] = None):
+        """Zapisuje wybór ruchu uczestnika"""
+        participant = self.participants[participant_id]
+        participant.selected_spell_id = spell_id
+        if target_id is not None:
+            participant.selected_target_id = target_id
+
+    def confirm_player(self, player_id: int):
+        """Oznacza żywe creatures gracza z wybranym spellem jako gotowe"""
+        for participant in self.participants.values():
+            if participant.player_id == player_id and participant.selected_spell_id and participant.is_alive:
+                participant.has_confirmed_move = True
+
+    @staticmethod
+    def sync_row(participant: ParticipantState) -> list:
+        return [participant.creature_id, participant.current_hp, participant.current_energy, participant.is_alive]
+
+    def snapshot(self) -> List[list]:
+        """Pełny stan: [creature_id, current_hp, current_energy, is_alive] dla każdego uczestnika"""
+        return [self.sync_row(p) for p in self.participants.values()]
+
+    def record_delta(self) -> List[list]:
+        """Zapisuje i zwraca zmiany od poprzedniej delty (wiersze jak w snapshot) pod seq = current_turn"""
+        rows = []
+        for participant_id, participant in self.participants.items():
+            row = self.sync_row(participant)
+            if row != self.synced[participant_id]:
+                self.synced[participant_id] = row
+                rows.append(row)
+        self.deltas.append((self.current_turn, rows))
+        return rows
+
+    def deltas_since(self, seq: int) -> Optional[List[list]]:
+        """Delty nowsze niż seq jako [seq, wiersze]; None gdy bufor już ich nie ma"""
+        if seq >= self.current_turn:
+            return []
+        if not self.deltas or self.deltas[0][0] > seq + 1:
+            return None
+        return [[delta_seq, rows] for delta_seq, rows in self.deltas if delta_seq > seq]
+
+    def team_ready(self, team: int) -> bool:
+        """Czy wszystkie żywe creatures drużyny mają potwierdzony ruch"""
+        return all(p.has_confirmed_move or not p.is_alive for p in self.participants.values() if p.team == team)
+
+    def reset_selections(self):
+        """Reset wyboru ruchów na następną turę"""
+        for participant in self.participants.values():
+            participant.selected_spell_id = None
+            participant.selected_target_id = None
+            participant.has_confirmed_move = False
+
+
+# Walki trwające w tym procesie (battle_id -> BattleState)
+_live_battles: Dict[str, BattleState] = {}
+
+
+def get_battle_state(battle: Battle) -> BattleState:
+    """Zwraca stan walki z pamięci, ładując go z bazy przy pierwszym użyciu"""
+    key = str(battle.id)
+    state = _live_battles.get(key)
+    if state is None:
+        state = BattleState.from_battle(battle)
+        _live_battles[key] = state
+    return state
+
+
+def find_battle_state(battle_id) -> Optional[BattleState]:
+    """Stan walki z pamięci albo None, bez ładowania z bazy"""
+    return _live_battles.get(str(battle_id))
+
+
+def drop_battle_state(battle_id):
+    """Usuwa stan zakończonej walki z pamięci"""
+    _live_battles.pop(str(battle_id), None)
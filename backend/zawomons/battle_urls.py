@@ -4,6 +4,7 @@ from .battle_views import (
     JoinBattleView, 
     BattleListView,
     BattleDetailView,
+    BattleActionsView,
     OpenBattlesView
 )
 
@@ -12,5 +13,6 @@ battle_urlpatterns = [
     path('battles/join/', JoinBattleView.as_view(), name='join-battle'),
     path('battles/', BattleListView.as_view(), name='battle-list'),
     path('battles/<uuid:battle_id>/', BattleDetailView.as_view(), name='battle-detail'),
+    path('battles/<uuid:battle_id>/actions/', BattleActionsView.as_view(), name='battle-actions'),
     path('battles/open/', OpenBattlesView.as_view(), name='open-battles'),
 ]
\ No newline at end of file
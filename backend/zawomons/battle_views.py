@@ -1,3 +1,4 @@
+from asgiref.sync import async_to_sync
 from django.shortcuts import get_object_or_404
 from django.db import models
 from rest_framework import permissions, status
@@ -8,9 +9,11 @@ from .battle_serializers import (
     BattleSerializer, 
     CreateBattleRequestSerializer, 
     JoinBattleRequestSerializer,
-    BattleParticipantSerializer
+    BattleParticipantSerializer,
+    BattleActionSerializer
 )
-from .battle_engine import BattleMatchmaker
+from .battle_actor import start_turn_clock
+from .battle_engine import BattleEngine, BattleMatchmaker
 from drf_spectacular.utils import extend_schema
 
 
@@ -77,9 +80,12 @@ class JoinBattleView(APIView):
             if not success:
                 return Response({'error': 'Failed to join battle'}, status=status.HTTP_400_BAD_REQUEST)
             
+            # Od teraz biegnie termin pierwszej tury
+            async_to_sync(start_turn_clock)(battle.id)
+            
             # Zwróć dane walki z uczestnikami
             battle_serializer = BattleSerializer(battle)
-            participants = BattleParticipant.objects.filter(battle=battle)
+            participants = BattleParticipant.objects.filter(battle=battle).select_related('creature', 'player__user')
             participants_serializer = BattleParticipantSerializer(participants, many=True)
             
             return Response({
@@ -136,7 +142,7 @@ class BattleDetailView(APIView):
             
             # Serializuj walkę z uczestnikami
             battle_serializer = BattleSerializer(battle)
-            participants = BattleParticipant.objects.filter(battle=battle)
+            participants = BattleParticipant.objects.filter(battle=battle).select_related('creature', 'player__user')
             participants_serializer = BattleParticipantSerializer(participants, many=True)
             
             return Response({
@@ -148,6 +154,34 @@ class BattleDetailView(APIView):
             return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+class BattleActionsView(APIView):
+    """Historia akcji walki (odtwarzana z seeda dla walk w trybie replay)"""
+    permission_classes = [permissions.IsAuthenticated]
+    
+    @extend_schema(responses=BattleActionSerializer(many=True))
+    def get(self, request, battle_id):
+        try:
+            # Pobierz gracza
+            player = get_object_or_404(Player, user=request.user)
+            
+            # Pobierz walkę (tylko te w których gracz uczestniczy)
+            battle = Battle.objects.filter(
+                id=battle_id
+            ).filter(
+                models.Q(player1=player) | models.Q(player2=player)
+            ).first()
+            
+            if not battle:
+                return Response({'error': 'Battle not found'}, status=status.HTTP_404_NOT_FOUND)
+            
+            actions = BattleEngine.get_battle_actions(battle)
+            serializer = BattleActionSerializer(actions, many=True)
+            return Response(serializer.data, status=status.HTTP_200_OK)
+            
+        except Exception as e:
+            return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
 class OpenBattlesView(APIView):
     """Lista otwartych walk oczekujących na graczy"""
     permission_classes = [permissions.IsAuthenticated]
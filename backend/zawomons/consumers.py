@@ -1,15 +1,19 @@
 import json
-import asyncio
-from typing import Dict, List
+from typing import List
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
 from django.contrib.auth.models import AnonymousUser
-from .models import Player, Creature, Spell
-from .models import Battle, BattleParticipant, BattleAction
-from .battle_engine import BattleEngine, BattleMatchmaker
+from django.db.models import Q
+from .models import Player, Creature
+from .models import Battle
+from .battle_engine import BattleMatchmaker
+from .battle_state import get_battle_state
+from .wire import WireCodecMixin, decode, encoded_event
+from .battle_actor import BattleActorError, get_battle_actor, start_turn_clock
+from .battle_reaper import start_battle_reaper
 
 
-class BattleConsumer(AsyncWebsocketConsumer):
+class BattleConsumer(WireCodecMixin, AsyncWebsocketConsumer):
     """WebSocket consumer dla walk online"""
     
     def __init__(self, *args, **kwargs):
@@ -18,6 +22,8 @@ class BattleConsumer(AsyncWebsocketConsumer):
         self.battle_group_name = None
         self.user = None
         self.player = None
+        self.spectating = False
+        self.waiting_battle = None  # utworzona walka czekająca na przeciwnika
     
     async def connect(self):
         """Połączenie WebSocket"""
@@ -34,39 +40,56 @@ class BattleConsumer(AsyncWebsocketConsumer):
             await self.close()
             return
         
-        await self.accept()
-        await self.send(text_data=json.dumps({
+        # Okresowe sprzątanie porzuconych walk (o ile włączone) startuje z pierwszym połączeniem
+        start_battle_reaper()
+        
+        await self.accept_with_codec()
+        await self.send_message({
             'type': 'connection_established',
             'message': 'Connected to battle server'
-        }))
+        })
     
     async def disconnect(self, close_code):
         """Rozłączenie WebSocket"""
+        # Twórca wyszedł przed dołączeniem przeciwnika - walka jest porzucona
+        if self.waiting_battle:
+            await database_sync_to_async(BattleMatchmaker.cancel_battle)(self.waiting_battle, self.player)
+        
         if self.battle_group_name:
             await self.channel_layer.group_discard(
                 self.battle_group_name,
                 self.channel_name
             )
     
-    async def receive(self, text_data):
+    async def receive(self, text_data=None, bytes_data=None):
         """Obsługa wiadomości od klienta"""
         try:
-            data = json.loads(text_data)
+            data = decode(text_data, bytes_data)
             message_type = data.get('type')
             
             if message_type == 'create_battle':
                 await self.create_battle(data)
             elif message_type == 'join_battle':
                 await self.join_battle(data)
+            elif message_type == 'cancel_battle':
+                await self.cancel_battle(data)
             elif message_type == 'select_move':
                 await self.select_move(data)
             elif message_type == 'confirm_ready':
                 await self.confirm_ready(data)
+            elif message_type == 'sync_request':
+                await self.sync_request(data)
+            elif message_type == 'resume_battle':
+                await self.resume_battle(data)
+            elif message_type == 'spectate_battle':
+                await self.spectate_battle(data)
             else:
                 await self.send_error(f"Unknown message type: {message_type}")
                 
         except json.JSONDecodeError:
             await self.send_error("Invalid JSON")
+        except ValueError:
+            await self.send_error("Invalid message")
         except Exception as e:
             await self.send_error(f"Error processing message: {str(e)}")
     
@@ -92,6 +115,8 @@ class BattleConsumer(AsyncWebsocketConsumer):
         
         self.battle_id = str(battle.id)
         self.battle_group_name = f"battle_{self.battle_id}"
+        self.spectating = False
+        self.waiting_battle = battle
         
         # Dołącz do grupy
         await self.channel_layer.group_add(
@@ -99,12 +124,12 @@ class BattleConsumer(AsyncWebsocketConsumer):
             self.channel_name
         )
         
-        await self.send(text_data=json.dumps({
+        await self.send_message({
             'type': 'battle_created',
             'battle_id': self.battle_id,
             'battle_type': battle_type,
             'waiting_for_opponent': True
-        }))
+        })
     
     async def join_battle(self, data):
         """Dołącza do istniejącej walki"""
@@ -139,6 +164,7 @@ class BattleConsumer(AsyncWebsocketConsumer):
         
         self.battle_id = battle_id
         self.battle_group_name = f"battle_{battle_id}"
+        self.spectating = False
         
         # Dołącz do grupy
         await self.channel_layer.group_add(
@@ -149,191 +175,166 @@ class BattleConsumer(AsyncWebsocketConsumer):
         # Wyślij informację o rozpoczęciu walki do obu graczy
         participants_data = await self.get_battle_participants_data(battle)
         
+        # Od teraz biegnie termin pierwszej tury (stan walki jest już w pamięci)
+        await start_turn_clock(battle_id)
+        
         await self.channel_layer.group_send(
             self.battle_group_name,
-            {
+            encoded_event({
                 'type': 'battle_started',
                 'battle_id': battle_id,
+                'seq': 0,
                 'participants': participants_data
-            }
+            })
         )
     
+    async def cancel_battle(self, data):
+        """Zamyka utworzoną walkę, do której nikt jeszcze nie dołączył"""
+        if not self.waiting_battle:
+            await self.send_error("No open battle to cancel")
+            return
+        
+        battle = self.waiting_battle
+        self.waiting_battle = None
+        cancelled = await database_sync_to_async(BattleMatchmaker.cancel_battle)(battle, self.player)
+        if not cancelled:
+            await self.send_error("Battle is no longer open")
+            return
+        
+        await self.channel_layer.group_discard(self.battle_group_name, self.channel_name)
+        self.battle_id = None
+        self.battle_group_name = None
+        await self.send_message({
+            'type': 'battle_cancelled',
+            'battle_id': str(battle.id)
+        })
+    
     async def select_move(self, data):
-        """Wybór ruchu gracza"""
+        """Wybór ruchu gracza (obsługiwany przez aktora walki)"""
         if not self.battle_id:
             await self.send_error("Not in battle")
             return
-        
-        creature_id = data.get('creature_id')
-        spell_id = data.get('spell_id')
-        target_id = data.get('target_id')  # opcjonalny
+        if self.spectating:
+            await self.send_error("Spectators cannot make moves")
+            return
         
         try:
-            battle = await database_sync_to_async(Battle.objects.get)(id=self.battle_id)
-            participant = await database_sync_to_async(
-                BattleParticipant.objects.get
-            )(battle=battle, creature_id=creature_id, player=self.player)
-            
-            spell = await database_sync_to_async(Spell.objects.get)(id=spell_id)
-            
-            # Sprawdź czy creature zna ten spell
-            knows_spell = await database_sync_to_async(
-                lambda: participant.creature.known_spells.filter(spell=spell).exists()
-            )()
-            
-            if not knows_spell:
-                await self.send_error("Creature doesn't know this spell")
-                return
-            
-            # Ustaw wybór
-            participant.selected_spell = spell
-            if target_id:
-                try:
-                    target = await database_sync_to_async(
-                        BattleParticipant.objects.get
-                    )(battle=battle, creature_id=target_id)
-                    participant.selected_target = target
-                except BattleParticipant.DoesNotExist:
-                    pass
-            
-            await database_sync_to_async(participant.save)()
-            
-            await self.send(text_data=json.dumps({
-                'type': 'move_selected',
-                'creature_id': creature_id,
-                'spell_id': spell_id,
-                'target_id': target_id
-            }))
-            
+            reply = await get_battle_actor(self.battle_id).ask('select_move', self.player, data)
+        except BattleActorError as e:
+            await self.send_error(str(e))
+            return
         except Exception as e:
             await self.send_error(f"Error selecting move: {str(e)}")
+            return
+        
+        await self.send_message(reply)
     
     async def confirm_ready(self, data):
-        """Potwierdza gotowość gracza do wykonania tury"""
+        """Potwierdza gotowość gracza do wykonania tury.
+        
+        Aktor walki wykonuje turę, gdy obie drużyny są gotowe, i sam wysyła
+        wyniki do grupy walki.
+        """
         if not self.battle_id:
             await self.send_error("Not in battle")
             return
+        if self.spectating:
+            await self.send_error("Spectators cannot make moves")
+            return
         
         try:
-            battle = await database_sync_to_async(Battle.objects.get)(id=self.battle_id)
-            
-            # Oznacz wszystkie creatures gracza jako gotowe
-            participants = await database_sync_to_async(lambda: list(
-                BattleParticipant.objects.filter(battle=battle, player=self.player)
-            ))()
-            
-            for participant in participants:
-                if participant.selected_spell and participant.is_alive:
-                    participant.has_confirmed_move = True
-                    await database_sync_to_async(participant.save)()
-            
-            # Sprawdź czy obaj gracze są gotowi
-            all_participants = await database_sync_to_async(lambda: list(
-                BattleParticipant.objects.filter(battle=battle)
-            ))()
-            
-            team1_ready = all(p.has_confirmed_move or not p.is_alive 
-                             for p in all_participants if p.team == 1)
-            team2_ready = all(p.has_confirmed_move or not p.is_alive 
-                             for p in all_participants if p.team == 2)
-            
-            if team1_ready and team2_ready:
-                # Wykonaj turę
-                await self.execute_turn(battle)
-            else:
-                # Powiadom o gotowości
-                await self.channel_layer.group_send(
-                    self.battle_group_name,
-                    {
-                        'type': 'player_ready',
-                        'player_id': self.player.id,
-                        'team1_ready': team1_ready,
-                        'team2_ready': team2_ready
-                    }
-                )
-                
+            await get_battle_actor(self.battle_id).ask('confirm_ready', self.player, data)
+        except BattleActorError as e:
+            await self.send_error(str(e))
         except Exception as e:
             await self.send_error(f"Error confirming ready: {str(e)}")
     
-    async def execute_turn(self, battle):
-        """Wykonuje turę i wysyła wyniki"""
+    async def resume_battle(self, data):
+        """Ponownie dołącza gracza do trwającej walki po zerwaniu połączenia"""
+        battle_id = data.get('battle_id') or await self.get_active_battle_id()
+        if not battle_id:
+            await self.send_error("No active battle")
+            return
+        
+        try:
+            reply = await get_battle_actor(battle_id).ask('resume_battle', self.player, data)
+        except BattleActorError as e:
+            await self.send_error(str(e))
+            return
+        
+        await self.attach_to_battle(battle_id, spectating=False)
+        await self.send_message(reply)
+    
+    async def spectate_battle(self, data):
+        """Obserwacja trwającej walki bez udziału (tylko odbiór wiadomości)"""
+        battle_id = data.get('battle_id')
+        if not battle_id:
+            await self.send_error("Battle ID required")
+            return
+        
         try:
-            # Wykonaj turę
-            actions = await database_sync_to_async(BattleEngine.execute_turn)(battle)
-            
-            # Przygotuj dane akcji dla klienta
-            actions_data = []
-            for action in actions:
-                action_data = {
-                    'action_type': action.action_type,
-                    'caster': {
-                        'creature_id': action.caster.creature.id,
-                        'name': action.caster.creature.name
-                    },
-                    'spell_name': action.spell_used.name if action.spell_used else None,
-                    'damage_amount': action.damage_amount,
-                    'heal_amount': action.heal_amount,
-                }
-                
-                if action.target:
-                    action_data['target'] = {
-                        'creature_id': action.target.creature.id,
-                        'name': action.target.creature.name,
-                        'hp_after': action.target_hp_after,
-                        'alive_after': action.target_alive_after
-                    }
-                
-                actions_data.append(action_data)
-            
-            # Sprawdź czy walka się skończyła
-            winner = await database_sync_to_async(BattleEngine.check_battle_end)(battle)
-            
-            if winner:
-                # Zastosuj wyniki walki
-                await database_sync_to_async(BattleEngine.apply_battle_results)(battle, winner)
-                
-                await self.channel_layer.group_send(
-                    self.battle_group_name,
-                    {
-                        'type': 'battle_ended',
-                        'winner': winner,
-                        'actions': actions_data
-                    }
-                )
-            else:
-                # Wyślij wyniki tury
-                await self.channel_layer.group_send(
-                    self.battle_group_name,
-                    {
-                        'type': 'turn_results',
-                        'turn_number': battle.current_turn - 1,
-                        'actions': actions_data
-                    }
-                )
-                
-        except Exception as e:
-            await self.send_error(f"Error executing turn: {str(e)}")
+            reply = await get_battle_actor(battle_id).ask('spectate_battle', self.player, data)
+        except BattleActorError as e:
+            await self.send_error(str(e))
+            return
+        
+        await self.attach_to_battle(battle_id, spectating=True)
+        await self.send_message(reply)
+    
+    async def attach_to_battle(self, battle_id, spectating: bool):
+        """Przenosi połączenie do grupy walki"""
+        if self.battle_group_name and self.battle_group_name != f"battle_{battle_id}":
+            await self.channel_layer.group_discard(self.battle_group_name, self.channel_name)
+        self.battle_id = str(battle_id)
+        self.battle_group_name = f"battle_{self.battle_id}"
+        self.spectating = spectating
+        await self.channel_layer.group_add(self.battle_group_name, self.channel_name)
+    
+    async def sync_request(self, data):
+        """Stan walki od numeru sekwencji since_seq (dla klienta, który zgubił wiadomości)"""
+        if not self.battle_id:
+            await self.send_error("Not in battle")
+            return
+        
+        try:
+            reply = await get_battle_actor(self.battle_id).ask('sync_request', self.player, data)
+        except BattleActorError as e:
+            await self.send_error(str(e))
+            return
+        
+        await self.send_message(reply)
     
-    # Event handlers dla group_send
+    # Event handlers dla group_send (wiadomości zakodowane raz przez nadawcę)
     async def battle_started(self, event):
-        await self.send(text_data=json.dumps(event))
+        self.waiting_battle = None
+        await self.forward(event)
     
     async def turn_results(self, event):
-        await self.send(text_data=json.dumps(event))
+        await self.forward(event)
     
     async def battle_ended(self, event):
-        await self.send(text_data=json.dumps(event))
+        await self.forward(event)
     
     async def player_ready(self, event):
-        await self.send(text_data=json.dumps(event))
+        await self.forward(event)
     
     # Helper methods
     async def send_error(self, message: str):
         """Wysyła błąd do klienta"""
-        await self.send(text_data=json.dumps({
+        await self.send_message({
             'type': 'error',
             'message': message
-        }))
+        })
+    
+    async def get_active_battle_id(self):
+        """Id trwającej walki gracza (najnowszej), o ile jakaś jest"""
+        battle_id = await database_sync_to_async(
+            Battle.objects.filter(
+                Q(player1=self.player) | Q(player2=self.player),
+                phase='selection'
+            ).order_by('-started_at').values_list('id', flat=True).first
+        )()
+        return str(battle_id) if battle_id else None
     
     async def validate_player_creatures(self, creature_ids: List[int]) -> bool:
         """Sprawdza czy gracz posiada podane creatures"""
@@ -349,22 +350,7 @@ class BattleConsumer(AsyncWebsocketConsumer):
             return False
     
     async def get_battle_participants_data(self, battle):
-        """Pobiera dane uczestników walki"""
-        participants = await database_sync_to_async(lambda: list(
-            BattleParticipant.objects.filter(battle=battle).select_related('creature', 'player')
-        ))()
-        
-        participants_data = []
-        for p in participants:
-            participant_data = {
-                'creature_id': p.creature.id,
-                'name': p.creature.name,
-                'max_hp': p.creature.max_hp,
-                'current_hp': p.current_hp,
-                'initiative': p.creature.initiative,
-                'team': p.team,
-                'player_name': p.player.user.username
-            }
-            participants_data.append(participant_data)
-        
-        return participants_data
\ No newline at end of file
+        """Dane uczestników walki ze stanu w pamięci (ładowanego tu przy starcie walki)"""
+        return await database_sync_to_async(
+            lambda: get_battle_state(battle).participants_data()
+        )()
\ No newline at end of file
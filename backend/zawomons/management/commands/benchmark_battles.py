@@ -0,0 +1,177 @@
+import json
+import platform
+import statistics
+import time
+import uuid
+import django
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from zawomons.models import Player, Creature, CreatureSpell, Spell
+from zawomons.battle_engine import BattleEngine, BattleMatchmaker
+from zawomons.battle_state import get_battle_state, drop_battle_state
+
+
+# Maksymalna liczba zapytań SQL na wywołanie (niezależna od rozmiaru drużyn)
+QUERY_BUDGETS = {
+    'join_battle': 5,  # zajęcie miejsca w walce, creatures obu drużyn, bulk_create uczestników + BEGIN/COMMIT
+    'execute_turn': 6,
+    'apply_battle_results': 7,  # EXP/HP creatures, zamknięcie walki i rating Elo (3 zapytania)
+}
+
+
+def parse_sizes(value):
+    return [int(item) for item in value.split(',') if item.strip()]
+
+
+def measure(func, *args):
+    """Wywołuje func i zwraca (wynik, czas w ms, liczba zapytań SQL)"""
+    with CaptureQueriesContext(connection) as queries:
+        started = time.perf_counter()
+        result = func(*args)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+    return result, elapsed_ms, len(queries)
+
+
+def summarize(timings, query_counts):
+    timings = sorted(timings)
+    return {
+        'samples': len(timings),
+        'mean_ms': statistics.fmean(timings) if timings else 0.0,
+        'p50_ms': timings[len(timings) // 2] if timings else 0.0,
+        'p95_ms': timings[min(len(timings) - 1, int(len(timings) * 0.95))] if timings else 0.0,
+        'max_ms': timings[-1] if timings else 0.0,
+        'queries_mean': statistics.fmean(query_counts) if query_counts else 0.0,
+        'queries_max': max(query_counts) if query_counts else 0,
+    }
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the battle engine (join, turns, results) for 1v1..6v6 and write results to JSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=parse_sizes, default=[1, 2, 3, 4, 5, 6],
+                            help='Comma separated team sizes (default: 1,2,3,4,5,6)')
+        parser.add_argument('--battles', type=int, default=5, help='Battles per team size')
+        parser.add_argument('--max-turns', type=int, default=30, help='Turn limit per battle')
+        parser.add_argument('--output', default='battle_benchmark.json', help='Output JSON file')
+        parser.add_argument('--enforce-budgets', action='store_true',
+                            help='Fail if any operation exceeds its query budget')
+
+    def handle(self, *args, **options):
+        spells = {spell.spell_id: spell for spell in Spell.objects.filter(spell_id__in=[0, 1])}
+        if 0 not in spells:
+            raise CommandError('Basic Attack (spell_id 0) not found - run load_spells first')
+
+        prefix = f'bench_{uuid.uuid4().hex[:8]}'
+        User = get_user_model()
+        try:
+            results = [
+                self.benchmark_size(size, options, spells, prefix)
+                for size in options['sizes']
+            ]
+        finally:
+            # Creatures mają owner SET_NULL - usuwamy je jawnie, resztę kaskadowo z użytkownikami
+            Creature.objects.filter(owner__user__username__startswith=prefix).delete()
+            User.objects.filter(username__startswith=prefix).delete()
+
+        over_budget = [
+            f"{row['team_size']}v{row['team_size']} {operation}: {row[operation]['queries_max']} > {budget}"
+            for row in results
+            for operation, budget in QUERY_BUDGETS.items()
+            if row[operation]['queries_max'] > budget
+        ]
+
+        report = {
+            'meta': {
+                'created_at': timezone.now().isoformat(),
+                'database': connection.vendor,
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'battles_per_size': options['battles'],
+                'max_turns': options['max_turns'],
+            },
+            'query_budgets': QUERY_BUDGETS,
+            'over_budget': over_budget,
+            'results': results,
+        }
+        with open(options['output'], 'w') as f:
+            json.dump(report, f, indent=2)
+
+        for row in results:
+            turns = row['execute_turn']
+            self.stdout.write(
+                f"{row['team_size']}v{row['team_size']}: "
+                f"{row['turns_per_second']:.1f} turns/s, "
+                f"execute_turn {turns['mean_ms']:.2f}ms avg / {turns['queries_max']} queries max, "
+                f"join_battle {row['join_battle']['mean_ms']:.2f}ms / {row['join_battle']['queries_max']} queries, "
+                f"apply_battle_results {row['apply_battle_results']['mean_ms']:.2f}ms / "
+                f"{row['apply_battle_results']['queries_max']} queries"
+            )
+        self.stdout.write(self.style.SUCCESS(f'Results written to {options["output"]}'))
+
+        for message in over_budget:
+            self.stdout.write(self.style.WARNING(f'Query budget exceeded - {message}'))
+        if over_budget and options['enforce_budgets']:
+            raise CommandError(f'{len(over_budget)} query budget(s) exceeded')
+
+    def benchmark_size(self, size, options, spells, prefix):
+        User = get_user_model()
+        join_timings, join_queries = [], []
+        turn_timings, turn_queries = [], []
+        result_timings, result_queries = [], []
+
+        for battle_number in range(options['battles']):
+            players, teams = [], []
+            for side in (1, 2):
+                user = User.objects.create(username=f'{prefix}_{size}_{battle_number}_{side}')
+                player = Player.objects.create(user=user)
+                creatures = Creature.objects.bulk_create([
+                    Creature(owner=player, name=f'Bench {side}-{slot}', main_element='none',
+                             max_hp=300, current_hp=300, initiative=10 + slot)
+                    for slot in range(size)
+                ])
+                CreatureSpell.objects.bulk_create([
+                    CreatureSpell(creature=creature, spell=spell)
+                    for creature in creatures for spell in spells.values()
+                ])
+                players.append(player)
+                teams.append([creature.id for creature in creatures])
+
+            battle = BattleMatchmaker.create_battle(players[0], 'ranked')
+            _, elapsed, queries = measure(BattleMatchmaker.join_battle, battle, players[1], teams[0], teams[1])
+            join_timings.append(elapsed)
+            join_queries.append(queries)
+
+            state = get_battle_state(battle)
+            winner = None
+            for _ in range(options['max_turns']):
+                for participant in state.participants.values():
+                    if participant.is_alive:
+                        state.select_move(participant.participant_id, spells[0].id)
+                for player in players:
+                    state.confirm_player(player.id)
+
+                turn, elapsed, queries = measure(BattleEngine.execute_turn, battle)
+                turn_timings.append(elapsed)
+                turn_queries.append(queries)
+                winner = turn.winner
+                if winner:
+                    break
+
+            _, elapsed, queries = measure(BattleEngine.apply_battle_results, battle, winner or 'draw')
+            result_timings.append(elapsed)
+            result_queries.append(queries)
+            drop_battle_state(battle.id)
+
+        turn_summary = summarize(turn_timings, turn_queries)
+        total_turn_seconds = sum(turn_timings) / 1000
+        return {
+            'team_size': size,
+            'turns_per_second': len(turn_timings) / total_turn_seconds if total_turn_seconds else 0.0,
+            'execute_turn': turn_summary,
+            'join_battle': summarize(join_timings, join_queries),
+            'apply_battle_results': summarize(result_timings, result_queries),
+        }
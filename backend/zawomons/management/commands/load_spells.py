@@ -1,5 +1,6 @@
 from django.core.management.base import BaseCommand
 from zawomons.models import Spell
+from zawomons.spell_effects import reset_spell_effects
 
 class Command(BaseCommand):
     help = 'Load spells data into the database, overwriting existing spells'
@@ -94,6 +95,9 @@ class Command(BaseCommand):
             if created:
                 spells_created += 1
 
+        # klucze główne spelli się zmieniły - rejestr efektów trzeba przeładować
+        reset_spell_effects()
+
         self.stdout.write(
             self.style.SUCCESS(
                 f'Successfully loaded {len(SPELLS_DATA)} spells ({spells_created} created, {len(SPELLS_DATA) - spells_created} updated)'
@@ -0,0 +1,338 @@
+import asyncio
+import json
+import threading
+import time
+import uuid
+from channels.db import database_sync_to_async
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.utils.crypto import get_random_string
+from zawomons.models import Player, Creature, CreatureSpell, Spell
+from zawomons.routing import websocket_urlpatterns as zawomons_ws
+from zawomons_gt.models import Lobby, LobbyPlayer
+from zawomons_gt.routing import websocket_urlpatterns as zawomons_gt_ws
+
+
+class QueryCounter:
+    """Liczy zapytania SQL ze wszystkich wątków (także z database_sync_to_async)"""
+
+    def __init__(self):
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, execute, sql, params, many, context):
+        with self._lock:
+            self.count += 1
+        return execute(sql, params, many, context)
+
+    def install(self, connection, **kwargs):
+        if self not in connection.execute_wrappers:
+            connection.execute_wrappers.append(self)
+
+    def __enter__(self):
+        # Połączenia otwarte później (np. w wątku database_sync_to_async) dostają licznik przy utworzeniu
+        for connection in connections.all():
+            self.install(connection)
+        connection_created.connect(self.install)
+        return self
+
+    def __exit__(self, *exc):
+        connection_created.disconnect(self.install)
+        for connection in connections.all():
+            if self in connection.execute_wrappers:
+                connection.execute_wrappers.remove(self)
+
+
+class ScopeUserMiddleware:
+    """Wstrzykuje użytkownika do scope zamiast sesji (AuthMiddlewareStack)"""
+
+    def __init__(self, app, user):
+        self.app = app
+        self.user = user
+
+    async def __call__(self, scope, receive, send):
+        return await self.app({**scope, 'user': self.user}, receive, send)
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def latency_summary(values):
+    return {
+        'samples': len(values),
+        'p50_ms': percentile(values, 0.50),
+        'p95_ms': percentile(values, 0.95),
+        'p99_ms': percentile(values, 0.99),
+        'max_ms': max(values) if values else 0.0,
+    }
+
+
+class Client:
+    """Połączenie WebSocket symulowanego gracza z licznikami wiadomości"""
+
+    def __init__(self, stats, app, user, path):
+        self.stats = stats
+        self.communicator = WebsocketCommunicator(ScopeUserMiddleware(app, user), path)
+
+    async def connect(self, ready_type):
+        started = time.perf_counter()
+        connected, _ = await self.communicator.connect(timeout=10)
+        if not connected:
+            raise CommandError(f'WebSocket connection refused: {self.communicator.scope["path"]}')
+        message = await self.receive_until(ready_type) if ready_type else None
+        self.stats['connect_ms'].append((time.perf_counter() - started) * 1000)
+        return message
+
+    async def send(self, message):
+        self.stats['sent'] += 1
+        await self.communicator.send_to(text_data=json.dumps(message))
+
+    async def receive_until(self, *types, timeout=30):
+        while True:
+            message = json.loads(await self.communicator.receive_from(timeout=timeout))
+            self.stats['received'] += 1
+            if message['type'] == 'error':
+                raise CommandError(f'Server error: {message["message"]}')
+            if message['type'] in types:
+                return message
+
+    async def receive_count(self, count, timeout=30):
+        for _ in range(count):
+            await self.communicator.receive_from(timeout=timeout)
+            self.stats['received'] += 1
+
+    async def close(self):
+        await self.communicator.disconnect()
+
+
+class Command(BaseCommand):
+    help = 'Load test battle, notification and lobby websockets in process and report latency and query counts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--players', type=int, default=20, help='Simulated players (paired into battles)')
+        parser.add_argument('--team-size', type=int, default=3, help='Creatures per player')
+        parser.add_argument('--max-turns', type=int, default=50, help='Turn limit per battle')
+        parser.add_argument('--lobbies', type=int, default=5, help='zawomons-gt lobbies')
+        parser.add_argument('--lobby-size', type=int, default=4, help='Guests per lobby')
+        parser.add_argument('--lobby-rounds', type=int, default=5, help='Chat and ready rounds per lobby')
+        parser.add_argument('--output', default=None, help='Write the report to this JSON file')
+
+    def handle(self, *args, **options):
+        if options['players'] < 2 or options['players'] % 2:
+            raise CommandError('--players must be an even number >= 2')
+        spell = Spell.objects.filter(spell_id=0).first()
+        if spell is None:
+            raise CommandError('Basic Attack (spell_id 0) not found - run load_spells first')
+
+        prefix = f'load_{uuid.uuid4().hex[:8]}'
+        User = get_user_model()
+        players = self.create_players(prefix, options, spell)
+        lobby_codes = []
+        try:
+            with QueryCounter() as queries:
+                report = asyncio.run(self.run(players, lobby_codes, spell, options, queries))
+        finally:
+            Lobby.objects.filter(code__in=lobby_codes).delete()
+            # Creatures mają owner SET_NULL - usuwamy je jawnie, resztę kaskadowo z użytkownikami
+            Creature.objects.filter(owner__user__username__startswith=prefix).delete()
+            User.objects.filter(username__startswith=prefix).delete()
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(report, f, indent=2)
+
+        for phase in ('notifications', 'battles', 'lobbies'):
+            row = report[phase]
+            self.stdout.write(
+                f"{phase}: {row['connections']} connections "
+                f"(connect p50 {row['connect']['p50_ms']:.1f}ms / p95 {row['connect']['p95_ms']:.1f}ms), "
+                f"{row['messages_per_second']:.0f} msg/s, {row['queries']} queries in {row['elapsed_s']:.2f}s"
+            )
+        turns = report['battles']['turn_latency']
+        self.stdout.write(
+            f"turn latency: p50 {turns['p50_ms']:.1f}ms, p95 {turns['p95_ms']:.1f}ms, "
+            f"p99 {turns['p99_ms']:.1f}ms over {turns['samples']} turns "
+            f"({report['battles']['queries_per_turn']:.1f} queries/turn)"
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"{report['battles']['finished']}/{report['battles']['battles']} battles finished"
+        ))
+
+    def create_players(self, prefix, options, spell):
+        User = get_user_model()
+        players = []
+        for index in range(options['players']):
+            user = User.objects.create(username=f'{prefix}_{index}')
+            player = Player.objects.create(user=user)
+            creatures = Creature.objects.bulk_create([
+                Creature(owner=player, name=f'Load {index}-{slot}', main_element='none',
+                         max_hp=200, current_hp=200, initiative=10 + slot)
+                for slot in range(options['team_size'])
+            ])
+            CreatureSpell.objects.bulk_create([CreatureSpell(creature=creature, spell=spell) for creature in creatures])
+            players.append((user, [creature.id for creature in creatures]))
+        return players
+
+    async def run(self, players, lobby_codes, spell, options, queries):
+        app = URLRouter(zawomons_ws + zawomons_gt_ws)
+        pairs = [(players[i], players[i + 1]) for i in range(0, len(players), 2)]
+
+        notifications = await self.run_phase(
+            queries, lambda stats: asyncio.gather(*(self.invite(app, stats, a, b) for a, b in pairs))
+        )
+        battle_ids = notifications.pop('result')
+
+        turn_latencies = []
+        battles = await self.run_phase(
+            queries, lambda stats: asyncio.gather(*(
+                self.fight(app, stats, battle_id, a, b, spell, options['max_turns'], turn_latencies)
+                for battle_id, (a, b) in zip(battle_ids, pairs)
+            ))
+        )
+        finished = sum(1 for winner in battles.pop('result') if winner)
+        battles.update({
+            'battles': len(pairs),
+            'finished': finished,
+            'turn_latency': latency_summary(turn_latencies),
+            'queries_per_turn': battles['queries'] / len(turn_latencies) if turn_latencies else 0.0,
+        })
+
+        codes = await database_sync_to_async(self.create_lobbies)(lobby_codes, options)
+        lobbies = await self.run_phase(
+            queries, lambda stats: asyncio.gather(*(
+                self.lobby(app, stats, code, options['lobby_size'], options['lobby_rounds']) for code in codes
+            ))
+        )
+        lobbies.pop('result')
+
+        return {
+            'meta': {
+                'players': options['players'],
+                'team_size': options['team_size'],
+                'lobbies': options['lobbies'],
+                'lobby_size': options['lobby_size'],
+                'database': connections['default'].vendor,
+            },
+            'notifications': notifications,
+            'battles': battles,
+            'lobbies': lobbies,
+        }
+
+    async def run_phase(self, queries, scenario):
+        """Uruchamia scenariusz i zbiera czas, wiadomości i zapytania SQL tej fazy"""
+        stats = {'connect_ms': [], 'sent': 0, 'received': 0}
+        queries_before = queries.count
+        started = time.perf_counter()
+        result = await scenario(stats)
+        elapsed = time.perf_counter() - started
+        return {
+            'result': result,
+            'elapsed_s': elapsed,
+            'connections': len(stats['connect_ms']),
+            'connect': latency_summary(stats['connect_ms']),
+            'messages_sent': stats['sent'],
+            'messages_received': stats['received'],
+            'messages_per_second': (stats['sent'] + stats['received']) / elapsed if elapsed else 0.0,
+            'queries': queries.count - queries_before,
+        }
+
+    async def invite(self, app, stats, inviter, invitee):
+        """Zaproszenie przez ws/notifications/ - zwraca id utworzonej walki"""
+        (inviter_user, inviter_creatures), (invitee_user, invitee_creatures) = inviter, invitee
+        sender = Client(stats, app, inviter_user, '/ws/notifications/')
+        receiver = Client(stats, app, invitee_user, '/ws/notifications/')
+        await sender.connect('pending_invitations')
+        await receiver.connect('pending_invitations')
+
+        await sender.send({
+            'type': 'send_game_invitation',
+            'receiver_username': invitee_user.username,
+            'sender_creatures': inviter_creatures,
+        })
+        invitation = await receiver.receive_until('game_invitation_received')
+        await receiver.send({
+            'type': 'respond_to_invitation',
+            'invitation_id': invitation['invitation_id'],
+            'response': 'accepted',
+            'receiver_creatures': invitee_creatures,
+        })
+        accepted = await sender.receive_until('invitation_accepted')
+        await receiver.receive_until('invitation_accepted')
+
+        await sender.close()
+        await receiver.close()
+        return accepted['battle_id']
+
+    async def fight(self, app, stats, battle_id, player1, player2, spell, max_turns, turn_latencies):
+        """Walka przez ws/battle/ do końca albo max_turns - zwraca zwycięzcę"""
+        clients = []
+        for user, creatures in (player1, player2):
+            client = Client(stats, app, user, '/ws/battle/')
+            await client.connect('connection_established')
+            await client.send({'type': 'resume_battle', 'battle_id': battle_id})
+            await client.receive_until('battle_resumed')
+            clients.append((client, set(creatures)))
+
+        alive = set(player1[1]) | set(player2[1])
+        winner = None
+        for _ in range(max_turns):
+            started = time.perf_counter()
+            for client, creatures in clients:
+                for creature_id in creatures & alive:
+                    await client.send({'type': 'select_move', 'creature_id': creature_id, 'spell_id': spell.id})
+                    await client.receive_until('move_selected')
+                await client.send({'type': 'confirm_ready'})
+
+            results = [await client.receive_until('turn_results', 'battle_ended') for client, _ in clients]
+            turn_latencies.append((time.perf_counter() - started) * 1000)
+
+            for creature_id, _, _, is_alive in results[0]['delta']:
+                if not is_alive:
+                    alive.discard(creature_id)
+            if results[0]['type'] == 'battle_ended':
+                winner = results[0]['winner']
+                break
+
+        for client, _ in clients:
+            await client.close()
+        return winner
+
+    def create_lobbies(self, lobby_codes, options):
+        for _ in range(options['lobbies']):
+            code = get_random_string(8).upper()
+            lobby = Lobby.objects.create(code=code, name=f'Load test {code}', max_players=options['lobby_size'])
+            LobbyPlayer.objects.bulk_create([
+                LobbyPlayer(lobby=lobby, guest_username=f'guest_{index}')
+                for index in range(options['lobby_size'])
+            ])
+            lobby_codes.append(code)
+        return list(lobby_codes)
+
+    async def lobby(self, app, stats, code, size, rounds):
+        """Czat i przełączanie gotowości w lobby ws/zawomons-gt/lobby/<code>/"""
+        guests = []
+        for index in range(size):
+            client = Client(stats, app, None, f'/ws/zawomons-gt/lobby/{code}/')
+            await client.connect('lobby_state')
+            await client.send({'type': 'identify', 'guest_username': f'guest_{index}'})
+            guests.append(client)
+
+        for round_number in range(rounds):
+            for index, client in enumerate(guests):
+                await client.send({'type': 'chat_message', 'message': f'round {round_number}', 'username': f'guest_{index}'})
+                await client.send({'type': 'player_ready', 'is_ready': round_number % 2 == 0,
+                                   'guest_username': f'guest_{index}'})
+            # Każdy gość dostaje czat i aktualizację lobby od każdego gościa
+            for client in guests:
+                await client.receive_count(2 * size)
+
+        for client in guests:
+            await client.close()
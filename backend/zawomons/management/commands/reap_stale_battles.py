@@ -0,0 +1,31 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from zawomons.battle_reaper import reap_stale_battles
+
+
+class Command(BaseCommand):
+    help = 'Close abandoned battles (waiting without an opponent, or stuck in selection) in bounded batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=settings.BATTLE_REAPER_BATCH_SIZE,
+                            help='Battles closed per UPDATE (default: BATTLE_REAPER_BATCH_SIZE)')
+        parser.add_argument('--max-batches', type=int, default=None,
+                            help='Stop after this many batches per phase (default: until no stale battles remain)')
+        parser.add_argument('--waiting-ttl', type=float, default=settings.BATTLE_WAITING_TTL,
+                            help='Seconds a battle may wait for an opponent (default: BATTLE_WAITING_TTL)')
+        parser.add_argument('--selection-ttl', type=float, default=settings.BATTLE_SELECTION_TTL,
+                            help='Seconds a battle may stay in selection (default: BATTLE_SELECTION_TTL)')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] <= 0:
+            raise CommandError('--batch-size must be positive')
+
+        reaped = reap_stale_battles(
+            batch_size=options['batch_size'],
+            max_batches=options['max_batches'],
+            waiting_ttl=options['waiting_ttl'],
+            selection_ttl=options['selection_ttl'],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Closed {len(reaped['waiting'])} waiting and {len(reaped['selection'])} stale in-progress battles"
+        ))
@@ -0,0 +1,84 @@
+import json
+import time
+from django.core.management.base import BaseCommand, CommandError
+from zawomons.models import Creature, Spell
+from zawomons.battle_core import ParticipantState
+from zawomons.battle_sim import simulate_battles
+from zawomons.spell_effects import get_spell_effects
+
+
+def parse_ids(value):
+    return [int(item) for item in value.split(',') if item.strip()]
+
+
+class Command(BaseCommand):
+    help = 'Run a Monte Carlo simulation of battles between two teams and report win rates'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--team1', type=parse_ids, required=True, help='Comma separated creature IDs of team 1')
+        parser.add_argument('--team2', type=parse_ids, required=True, help='Comma separated creature IDs of team 2')
+        parser.add_argument('--team1-spells', type=parse_ids, default=[0],
+                            help='Spell IDs (Spell.spell_id) cast by team 1, one per creature or one for all (default: 0)')
+        parser.add_argument('--team2-spells', type=parse_ids, default=[0],
+                            help='Spell IDs (Spell.spell_id) cast by team 2, one per creature or one for all (default: 0)')
+        parser.add_argument('--battles', type=int, default=10000, help='Number of simulated battles')
+        parser.add_argument('--max-turns', type=int, default=100, help='Turn limit per battle')
+        parser.add_argument('--seed', type=int, default=None, help='Random seed for reproducible runs')
+        parser.add_argument('--json', action='store_true', help='Print results as JSON')
+
+    def handle(self, *args, **options):
+        creatures = Creature.objects.in_bulk(options['team1'] + options['team2'])
+        missing = set(options['team1'] + options['team2']) - set(creatures)
+        if missing:
+            raise CommandError(f'Creatures not found: {sorted(missing)}')
+
+        spell_ids = set(options['team1_spells'] + options['team2_spells'])
+        spells = {spell.spell_id: spell for spell in Spell.objects.filter(spell_id__in=spell_ids)}
+        if spell_ids - set(spells):
+            raise CommandError(f'Spells not found: {sorted(spell_ids - set(spells))}')
+
+        participants = []
+        for team, creature_ids, team_spells in (
+            (1, options['team1'], options['team1_spells']),
+            (2, options['team2'], options['team2_spells']),
+        ):
+            if len(team_spells) not in (1, len(creature_ids)):
+                raise CommandError(f'Team {team}: give one spell for all creatures or one per creature')
+            for slot, creature_id in enumerate(creature_ids):
+                creature = creatures[creature_id]
+                spell = spells[team_spells[slot] if len(team_spells) > 1 else team_spells[0]]
+                participants.append(ParticipantState(
+                    participant_id=len(participants),
+                    creature_id=creature.id,
+                    player_id=team,
+                    team=team,
+                    name=creature.name,
+                    max_hp=creature.max_hp,
+                    current_hp=creature.max_hp,
+                    current_energy=creature.max_energy,
+                    damage=creature.damage,
+                    initiative=creature.initiative,
+                    experience=creature.experience,
+                    selected_spell_id=spell.id,
+                    has_confirmed_move=True,
+                ))
+
+        spell_effects = get_spell_effects()
+
+        started = time.perf_counter()
+        result = simulate_battles(
+            participants, spell_effects,
+            battles=options['battles'], max_turns=options['max_turns'], seed=options['seed']
+        )
+        elapsed = time.perf_counter() - started
+
+        if options['json']:
+            self.stdout.write(json.dumps({**result.as_dict(), 'elapsed_seconds': elapsed}, indent=2))
+            return
+
+        self.stdout.write(f'Simulated {result.battles} battles in {elapsed:.2f}s')
+        self.stdout.write(f'  Team 1 wins: {result.team1_wins} ({result.team1_win_rate:.1%})')
+        self.stdout.write(f'  Team 2 wins: {result.team2_wins} ({result.team2_win_rate:.1%})')
+        self.stdout.write(f'  Draws: {result.draws}')
+        self.stdout.write(f'  Unfinished after {options["max_turns"]} turns: {result.unfinished}')
+        self.stdout.write(self.style.SUCCESS(f'Average battle length: {result.average_turns:.2f} turns'))
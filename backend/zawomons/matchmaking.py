@@ -0,0 +1,159 @@
+"""Kolejka walk rankingowych (ranked) w procesie.
+
+Gracze czekają w kubełkach według ratingu (przedział MATCHMAKING_RATING_BAND).
+Nowy gracz szuka przeciwnika od razu w swoim kubełku; im dłużej czeka, tym
+więcej sąsiednich kubełków przeszukuje (jeden przedział więcej co
+MATCHMAKING_WIDEN_AFTER sekund). Czas dobierania zależy więc od liczby
+czekających graczy, a nie od liczby walk w bazie.
+
+Kolejka żyje w pamięci procesu - tak jak aktorzy walk, zakłada jeden proces
+serwera WebSocket.
+"""
+import asyncio
+import logging
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Dict, List, Optional, Set
+
+from channels.db import database_sync_to_async
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.db import transaction
+
+from .battle_actor import start_turn_clock
+from .battle_engine import BattleMatchmaker
+from .models import Battle
+from .wire import encoded_event
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class QueueTicket:
+    """Gracz czekający w kolejce"""
+    player: object
+    channel_name: str
+    team_creatures: List[int]
+    rating: int
+    enqueued_at: float = 0.0  # czas pętli asyncio
+    bucket: int = field(default=0, init=False)
+
+
+class MatchmakingQueue:
+    """Kubełki ratingowe z graczami w kolejności dołączenia, parowane przez jedno zadanie asyncio"""
+
+    def __init__(self, on_match: Callable[[QueueTicket, QueueTicket], Awaitable[None]]):
+        self.on_match = on_match
+        self._buckets: Dict[int, "OrderedDict[int, QueueTicket]"] = {}
+        self._tickets: Dict[int, QueueTicket] = {}  # player_id -> bilet
+        self._task: Optional[asyncio.Task] = None
+        self._pairing: Set[asyncio.Task] = set()  # trwające tworzenie walk (referencje, żeby zadania nie zniknęły)
+
+    def __len__(self):
+        return len(self._tickets)
+
+    def __contains__(self, player_id):
+        return player_id in self._tickets
+
+    def enqueue(self, ticket: QueueTicket):
+        """Dodaje gracza (ponowne dołączenie podmienia bilet) i od razu szuka mu przeciwnika"""
+        loop = asyncio.get_running_loop()
+        self.remove(ticket.player.id)
+        ticket.enqueued_at = loop.time()
+        ticket.bucket = ticket.rating // settings.MATCHMAKING_RATING_BAND
+        self._buckets.setdefault(ticket.bucket, OrderedDict())[ticket.player.id] = ticket
+        self._tickets[ticket.player.id] = ticket
+
+        if self._match(ticket, loop.time()) is None and (self._task is None or self._task.done()):
+            self._task = loop.create_task(self._run())
+
+    def remove(self, player_id, channel_name: Optional[str] = None) -> bool:
+        """Usuwa gracza z kolejki (z channel_name - tylko bilet tego połączenia)"""
+        ticket = self._tickets.get(player_id)
+        if ticket is None or (channel_name and ticket.channel_name != channel_name):
+            return False
+        del self._tickets[player_id]
+        bucket = self._buckets[ticket.bucket]
+        del bucket[player_id]
+        if not bucket:
+            del self._buckets[ticket.bucket]
+        return True
+
+    def _radius(self, ticket: QueueTicket, now: float) -> int:
+        """Ile przedziałów ratingu w każdą stronę przeszukuje bilet po dotychczasowym czekaniu"""
+        if settings.MATCHMAKING_WIDEN_AFTER <= 0:
+            return 0
+        return int((now - ticket.enqueued_at) // settings.MATCHMAKING_WIDEN_AFTER)
+
+    def _match(self, ticket: QueueTicket, now: float) -> Optional[QueueTicket]:
+        """Najdłużej czekający przeciwnik z najbliższego kubełka; para od razu wychodzi z kolejki"""
+        radius = self._radius(ticket, now)
+        for distance in range(radius + 1):
+            buckets = (ticket.bucket - distance, ticket.bucket + distance) if distance else (ticket.bucket,)
+            for bucket in buckets:
+                for opponent in self._buckets.get(bucket, {}).values():
+                    # Przeciwnik też musi już akceptować taką różnicę ratingu
+                    if opponent is not ticket and self._radius(opponent, now) >= distance:
+                        self.remove(ticket.player.id)
+                        self.remove(opponent.player.id)
+                        task = asyncio.get_running_loop().create_task(self._pair(opponent, ticket))
+                        self._pairing.add(task)
+                        task.add_done_callback(self._pairing.discard)
+                        return opponent
+        return None
+
+    async def _pair(self, first: QueueTicket, second: QueueTicket):
+        try:
+            await self.on_match(first, second)
+        except Exception:
+            logger.exception(f"Matchmaking failed for players {first.player.id} and {second.player.id}")
+
+    async def _run(self):
+        """Co MATCHMAKING_WIDEN_AFTER sekund poszerza wyszukiwanie czekających (najstarsi pierwsi)"""
+        loop = asyncio.get_running_loop()
+        interval = settings.MATCHMAKING_WIDEN_AFTER if settings.MATCHMAKING_WIDEN_AFTER > 0 else 1.0
+        while self._tickets:
+            await asyncio.sleep(interval)
+            now = loop.time()
+            for ticket in sorted(self._tickets.values(), key=lambda t: t.enqueued_at):
+                if ticket.player.id in self._tickets:
+                    self._match(ticket, now)
+        # Pusta kolejka - zadanie kończy się i wstaje przy następnym enqueue()
+
+
+def create_ranked_battle(first: QueueTicket, second: QueueTicket) -> Battle:
+    """Tworzy i od razu rozpoczyna walkę ranked dla dobranej pary"""
+    with transaction.atomic():
+        battle = BattleMatchmaker.create_battle(first.player, 'ranked')
+        BattleMatchmaker.join_battle(battle, second.player, first.team_creatures, second.team_creatures)
+    return battle
+
+
+async def _on_match(first: QueueTicket, second: QueueTicket):
+    """Tworzy walkę dla pary i wysyła obu graczom match_found (dalej gra się przez ws/battle/)"""
+    channel_layer = get_channel_layer()
+    try:
+        battle = await database_sync_to_async(create_ranked_battle)(first, second)
+    except Exception as e:
+        for ticket in (first, second):
+            await channel_layer.send(ticket.channel_name, encoded_event({
+                'type': 'match_failed',
+                'message': str(e)
+            }))
+        raise
+
+    # Od teraz biegnie termin pierwszej tury
+    await start_turn_clock(battle.id)
+
+    for ticket, opponent in ((first, second), (second, first)):
+        await channel_layer.send(ticket.channel_name, encoded_event({
+            'type': 'match_found',
+            'battle_id': str(battle.id),
+            'battle_type': battle.battle_type,
+            'opponent_name': opponent.player.user.username,
+            'opponent_rating': opponent.rating
+        }))
+
+
+# Jedna kolejka ranked dla wszystkich połączeń w procesie
+matchmaking_queue = MatchmakingQueue(_on_match)
@@ -0,0 +1,137 @@
+import json
+from typing import List
+from channels.generic.websocket import AsyncWebsocketConsumer
+from channels.db import database_sync_to_async
+from django.contrib.auth.models import AnonymousUser
+from .models import Player, PlayerRating, Creature
+from .matchmaking import QueueTicket, matchmaking_queue
+from .wire import WireCodecMixin, decode
+
+
+class MatchmakingConsumer(WireCodecMixin, AsyncWebsocketConsumer):
+    """WebSocket consumer kolejki walk ranked (zamiast odpytywania listy otwartych walk)"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.user = None
+        self.player = None
+
+    async def connect(self):
+        """Połączenie z kolejką"""
+        # Sprawdź autoryzację
+        self.user = self.scope["user"]
+        if isinstance(self.user, AnonymousUser):
+            await self.close()
+            return
+
+        # Pobierz gracza (z userem - nazwa gracza trafia do wiadomości przeciwnika)
+        try:
+            self.player = await database_sync_to_async(
+                Player.objects.select_related('user').get
+            )(user=self.user)
+        except Player.DoesNotExist:
+            await self.close()
+            return
+
+        await self.accept_with_codec()
+        await self.send_message({
+            'type': 'connection_established',
+            'message': 'Connected to matchmaking'
+        })
+
+    async def disconnect(self, close_code):
+        """Rozłączenie - gracz wychodzi z kolejki"""
+        if self.player:
+            matchmaking_queue.remove(self.player.id, self.channel_name)
+
+    async def receive(self, text_data=None, bytes_data=None):
+        """Obsługa wiadomości od klienta"""
+        try:
+            data = decode(text_data, bytes_data)
+            message_type = data.get('type')
+
+            if message_type == 'join_queue':
+                await self.join_queue(data)
+            elif message_type == 'leave_queue':
+                await self.leave_queue(data)
+            else:
+                await self.send_error(f"Unknown message type: {message_type}")
+
+        except json.JSONDecodeError:
+            await self.send_error("Invalid JSON")
+        except ValueError:
+            await self.send_error("Invalid message")
+        except Exception as e:
+            await self.send_error(f"Error processing message: {str(e)}")
+
+    async def join_queue(self, data):
+        """Dołącza gracza do kolejki ranked z wybraną drużyną"""
+        team_creatures = data.get('team_creatures', [])
+
+        if not team_creatures:
+            await self.send_error("No creatures selected")
+            return
+
+        valid_creatures = await self.validate_player_creatures(team_creatures)
+        if not valid_creatures:
+            await self.send_error("Invalid creatures selected")
+            return
+
+        rating = await self.get_rating()
+
+        matchmaking_queue.enqueue(QueueTicket(
+            player=self.player,
+            channel_name=self.channel_name,
+            team_creatures=list(team_creatures),
+            rating=rating
+        ))
+
+        # Przy natychmiastowym dobraniu match_found przyjdzie zaraz po tej wiadomości
+        await self.send_message({
+            'type': 'queue_joined',
+            'rating': rating,
+            'queue_size': len(matchmaking_queue)
+        })
+
+    async def leave_queue(self, data):
+        """Wychodzi z kolejki"""
+        left = matchmaking_queue.remove(self.player.id, self.channel_name)
+        await self.send_message({
+            'type': 'queue_left',
+            'was_queued': left
+        })
+
+    # Event handlers dla wiadomości od kolejki (zakodowane raz przez nadawcę)
+    async def match_found(self, event):
+        await self.forward(event)
+
+    async def match_failed(self, event):
+        await self.forward(event)
+
+    # Helper methods
+    async def send_error(self, message: str):
+        """Wysyła błąd do klienta"""
+        await self.send_message({
+            'type': 'error',
+            'message': message
+        })
+
+    async def validate_player_creatures(self, creature_ids: List[int]) -> bool:
+        """Sprawdza czy gracz posiada podane creatures"""
+        try:
+            count = await database_sync_to_async(
+                Creature.objects.filter(
+                    id__in=creature_ids,
+                    owner=self.player
+                ).count
+            )()
+            return count == len(set(creature_ids))
+        except (TypeError, ValueError):
+            return False
+
+    async def get_rating(self) -> int:
+        """Rating Elo gracza (startowy przed pierwszą walką ranked)"""
+        rating = await database_sync_to_async(
+            PlayerRating.objects.filter(player=self.player).values_list('rating', flat=True).first
+        )()
+        return PlayerRating.DEFAULT_RATING if rating is None else rating
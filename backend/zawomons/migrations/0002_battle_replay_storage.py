@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:24
+
+import django.db.models.deletion
+import zawomons.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('zawomons', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='battle',
+            name='initial_state',
+            field=models.JSONField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='battle',
+            name='rng_seed',
+            field=models.BigIntegerField(default=zawomons.models.generate_battle_seed),
+        ),
+        migrations.AddField(
+            model_name='battle',
+            name='storage_mode',
+            field=models.CharField(choices=[('actions', 'Full action log'), ('replay', 'Seed and selections')], default='actions', max_length=10),
+        ),
+        migrations.CreateModel(
+            name='BattleTurnRecord',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('turn_number', models.IntegerField()),
+                ('selections', models.JSONField(default=list)),
+                ('battle', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='turn_records', to='zawomons.battle')),
+            ],
+            options={
+                'ordering': ['turn_number'],
+                'unique_together': {('battle', 'turn_number')},
+            },
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('zawomons', '0003_player_rating'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='battle',
+            index=models.Index(fields=['phase', 'created_at'], name='zawomons_battle_phase_idx'),
+        ),
+    ]
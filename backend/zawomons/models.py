@@ -1,6 +1,7 @@
 from django.db import models
 from django.conf import settings
 from django.utils import timezone
+import secrets
 import uuid
 
 class Player(models.Model):
@@ -26,6 +27,28 @@ class Player(models.Model):
     def __str__(self):
         return f"{self.user.username}"
 
+class PlayerRating(models.Model):
+    """Rating Elo gracza w walkach ranked, aktualizowany przyrostowo po każdej walce"""
+    DEFAULT_RATING = 1000
+
+    player = models.OneToOneField(Player, on_delete=models.CASCADE, primary_key=True, related_name='rating')
+    rating = models.IntegerField(default=DEFAULT_RATING)
+
+    # statystyki walk ranked
+    games_played = models.IntegerField(default=0)
+    wins = models.IntegerField(default=0)
+    losses = models.IntegerField(default=0)
+    draws = models.IntegerField(default=0)
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        # ranking (top N i pozycja gracza) czytany po indeksie, bez sortowania całej tabeli
+        indexes = [models.Index(fields=['-rating', 'player'], name='zawomons_rating_rank_idx')]
+
+    def __str__(self):
+        return f"{self.player} - {self.rating}"
+
 class Creature(models.Model):
     """Model dla stworków gracza w grze zawomons"""
     # właściciel (może być null dla dzikich stworków)
@@ -119,6 +142,11 @@ class City(models.Model):
 
 ### Battle Models for WebSocket battles
 
+def generate_battle_seed():
+    """Losowy seed PRNG walki (mieści się w BigIntegerField)"""
+    return secrets.randbits(62)
+
+
 class Battle(models.Model):
     """Model reprezentujący walkę między dwoma graczami"""
     
@@ -134,6 +162,11 @@ class Battle(models.Model):
         ('finished', 'Battle finished'),
     ]
     
+    STORAGE_MODES = [
+        ('actions', 'Full action log'),    # każda akcja zapisana jako BattleAction
+        ('replay', 'Seed and selections'),  # tylko seed + wybory ruchów, akcje odtwarzane na żądanie
+    ]
+    
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     battle_type = models.CharField(max_length=10, choices=BATTLE_TYPES, default='friendly')
     phase = models.CharField(max_length=10, choices=BATTLE_PHASES, default='waiting')
@@ -147,11 +180,20 @@ class Battle(models.Model):
     
     current_turn = models.IntegerField(default=0)
     
+    # deterministyczne odtwarzanie walki
+    rng_seed = models.BigIntegerField(default=generate_battle_seed)
+    storage_mode = models.CharField(max_length=10, choices=STORAGE_MODES, default='actions')
+    initial_state = models.JSONField(null=True, blank=True)  # stan uczestników przed pierwszą turą (tryb replay)
+    
     # metadata
     created_at = models.DateTimeField(auto_now_add=True)
     started_at = models.DateTimeField(null=True, blank=True)
     finished_at = models.DateTimeField(null=True, blank=True)
     
+    class Meta:
+        # otwarte/trwające walki po fazie i wieku (lista otwartych walk, sprzątanie porzuconych)
+        indexes = [models.Index(fields=['phase', 'created_at'], name='zawomons_battle_phase_idx')]
+    
     def __str__(self):
         return f"Battle {self.id} - {self.player1} vs {self.player2 or 'waiting'}"
 
@@ -181,7 +223,7 @@ class BattleParticipant(models.Model):
         self.selected_spell = None
         self.selected_target = None
         self.has_confirmed_move = False
-        self.save()
+        self.save(update_fields=['selected_spell', 'selected_target', 'has_confirmed_move'])
     
     @property
     def is_alive(self):
@@ -229,6 +271,22 @@ class BattleAction(models.Model):
     def __str__(self):
         return f"T{self.turn_number}.{self.action_order}: {self.caster.creature.name} -> {self.action_type}"
 
+class BattleTurnRecord(models.Model):
+    """Wybory ruchów z jednej tury - wystarczają (razem z seedem) do odtworzenia akcji"""
+    
+    battle = models.ForeignKey(Battle, on_delete=models.CASCADE, related_name='turn_records')
+    turn_number = models.IntegerField()
+    
+    # lista [participant_id, spell_id, target_id] potwierdzonych ruchów
+    selections = models.JSONField(default=list)
+    
+    class Meta:
+        unique_together = ('battle', 'turn_number')
+        ordering = ['turn_number']
+    
+    def __str__(self):
+        return f"Battle {self.battle_id} - turn {self.turn_number}"
+
 class GameInvitation(models.Model):
     """Model zaproszenia do gry"""
     
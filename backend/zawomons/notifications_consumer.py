@@ -4,12 +4,16 @@ from typing import Dict, List
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
 from django.contrib.auth.models import AnonymousUser
+from django.db import transaction
 from django.utils import timezone
 from .models import Player, GameInvitation, Battle
+from .battle_actor import start_turn_clock
 from .battle_engine import BattleMatchmaker
+from .battle_state import get_battle_state
+from .wire import WireCodecMixin, decode, encoded_event
 
 
-class GlobalNotificationsConsumer(AsyncWebsocketConsumer):
+class GlobalNotificationsConsumer(WireCodecMixin, AsyncWebsocketConsumer):
     """Global WebSocket consumer dla powiadomień (zaproszenia do gry, wiadomości, etc.)"""
     
     def __init__(self, *args, **kwargs):
@@ -40,13 +44,13 @@ class GlobalNotificationsConsumer(AsyncWebsocketConsumer):
             self.channel_name
         )
         
-        await self.accept()
-        await self.send(text_data=json.dumps({
+        await self.accept_with_codec()
+        await self.send_message({
             'type': 'connection_established',
             'message': 'Connected to notifications',
             'user_id': self.user.id,
             'username': self.user.username
-        }))
+        })
         
         # Wyślij pending invitations przy połączeniu
         await self.send_pending_invitations()
@@ -59,10 +63,10 @@ class GlobalNotificationsConsumer(AsyncWebsocketConsumer):
                 self.channel_name
             )
     
-    async def receive(self, text_data):
+    async def receive(self, text_data=None, bytes_data=None):
         """Obsługa wiadomości od klienta"""
         try:
-            data = json.loads(text_data)
+            data = decode(text_data, bytes_data)
             message_type = data.get('type')
             
             if message_type == 'send_game_invitation':
@@ -78,6 +82,8 @@ class GlobalNotificationsConsumer(AsyncWebsocketConsumer):
                 
         except json.JSONDecodeError:
             await self.send_error("Invalid JSON")
+        except ValueError:
+            await self.send_error("Invalid message")
         except Exception as e:
             await self.send_error(f"Error processing message: {str(e)}")
     
@@ -142,22 +148,22 @@ class GlobalNotificationsConsumer(AsyncWebsocketConsumer):
             
             # Wyślij powiadomienie do receiver
             receiver_group = f"user_{receiver_user.id}"
-            await self.channel_layer.group_send(receiver_group, {
+            await self.channel_layer.group_send(receiver_group, encoded_event({
                 'type': 'game_invitation_received',
                 'invitation_id': str(invitation.id),
                 'sender_username': self.user.username,
                 'invitation_type': invitation_type,
                 'expires_at': invitation.expires_at.isoformat(),
                 'sender_creatures_count': len(sender_creatures)
-            })
+            }))
             
             # Potwierdź wysłanie sender-owi
-            await self.send(text_data=json.dumps({
+            await self.send_message({
                 'type': 'invitation_sent',
                 'invitation_id': str(invitation.id),
                 'receiver_username': receiver_username,
                 'message': f'Invitation sent to {receiver_username}'
-            }))
+            })
             
         except Exception as e:
             await self.send_error(f"Error sending invitation: {str(e)}")
@@ -176,7 +182,7 @@ class GlobalNotificationsConsumer(AsyncWebsocketConsumer):
             # Pobierz zaproszenie
             try:
                 invitation = await database_sync_to_async(
-                    GameInvitation.objects.get
+                    GameInvitation.objects.select_related('sender__user', 'receiver').get
                 )(id=invitation_id, receiver=self.player)
             except GameInvitation.DoesNotExist:
                 await self.send_error("Invitation not found")
@@ -202,17 +208,12 @@ class GlobalNotificationsConsumer(AsyncWebsocketConsumer):
                         await self.send_error("Invalid creatures selected")
                         return
                 
-                # Utwórz walkę
-                battle = await database_sync_to_async(BattleMatchmaker.create_battle)(
-                    invitation.sender, invitation.invitation_type
+                # Utwórz walkę i dołącz graczy
+                battle = await database_sync_to_async(self.create_invitation_battle)(
+                    invitation, receiver_creatures
                 )
                 
-                # Dołącz graczy do walki
-                success = await database_sync_to_async(BattleMatchmaker.join_battle)(
-                    battle, invitation.receiver, invitation.sender_creatures, receiver_creatures
-                )
-                
-                if success:
+                if battle is not None:
                     # Powiąż zaproszenie z walką
                     invitation.battle = battle
                     await database_sync_to_async(invitation.save)()
@@ -220,34 +221,37 @@ class GlobalNotificationsConsumer(AsyncWebsocketConsumer):
                     # Powiadom obu graczy o rozpoczęciu walki
                     battle_data = await self.get_battle_start_data(battle)
                     
-                    await self.channel_layer.group_send(sender_group, {
+                    # Od teraz biegnie termin pierwszej tury (stan walki jest już w pamięci)
+                    await start_turn_clock(battle.id)
+                    
+                    await self.channel_layer.group_send(sender_group, encoded_event({
                         'type': 'invitation_accepted',
                         'invitation_id': str(invitation.id),
                         'receiver_username': self.user.username,
                         'battle_id': str(battle.id),
                         'battle_data': battle_data
-                    })
+                    }))
                     
-                    await self.send(text_data=json.dumps({
+                    await self.send_message({
                         'type': 'invitation_accepted',
                         'invitation_id': str(invitation.id),
                         'battle_id': str(battle.id),
                         'battle_data': battle_data
-                    }))
+                    })
                 else:
                     await self.send_error("Failed to create battle")
             else:
                 # Zaproszenie odrzucone
-                await self.channel_layer.group_send(sender_group, {
+                await self.channel_layer.group_send(sender_group, encoded_event({
                     'type': 'invitation_declined',
                     'invitation_id': str(invitation.id),
                     'receiver_username': self.user.username
-                })
+                }))
                 
-                await self.send(text_data=json.dumps({
+                await self.send_message({
                     'type': 'invitation_declined',
                     'invitation_id': str(invitation.id)
-                }))
+                })
             
         except Exception as e:
             await self.send_error(f"Error responding to invitation: {str(e)}")
@@ -264,7 +268,7 @@ class GlobalNotificationsConsumer(AsyncWebsocketConsumer):
             # Pobierz zaproszenie (tylko sender może anulować)
             try:
                 invitation = await database_sync_to_async(
-                    GameInvitation.objects.get
+                    GameInvitation.objects.select_related('receiver__user').get
                 )(id=invitation_id, sender=self.player, status='pending')
             except GameInvitation.DoesNotExist:
                 await self.send_error("Invitation not found or cannot be cancelled")
@@ -276,16 +280,16 @@ class GlobalNotificationsConsumer(AsyncWebsocketConsumer):
             
             # Powiadom receiver o anulowaniu
             receiver_group = f"user_{invitation.receiver.user.id}"
-            await self.channel_layer.group_send(receiver_group, {
+            await self.channel_layer.group_send(receiver_group, encoded_event({
                 'type': 'invitation_cancelled',
                 'invitation_id': str(invitation.id),
                 'sender_username': self.user.username
-            })
+            }))
             
-            await self.send(text_data=json.dumps({
+            await self.send_message({
                 'type': 'invitation_cancelled',
                 'invitation_id': str(invitation.id)
-            }))
+            })
             
         except Exception as e:
             await self.send_error(f"Error cancelling invitation: {str(e)}")
@@ -332,35 +336,35 @@ class GlobalNotificationsConsumer(AsyncWebsocketConsumer):
                     'expires_at': inv.expires_at.isoformat()
                 })
             
-            await self.send(text_data=json.dumps({
+            await self.send_message({
                 'type': 'pending_invitations',
                 'received_invitations': received_data,
                 'sent_invitations': sent_data
-            }))
+            })
             
         except Exception as e:
             await self.send_error(f"Error getting pending invitations: {str(e)}")
     
-    # Event handlers dla group_send
+    # Event handlers dla group_send (wiadomości zakodowane raz przez nadawcę)
     async def game_invitation_received(self, event):
-        await self.send(text_data=json.dumps(event))
+        await self.forward(event)
     
     async def invitation_accepted(self, event):
-        await self.send(text_data=json.dumps(event))
+        await self.forward(event)
     
     async def invitation_declined(self, event):
-        await self.send(text_data=json.dumps(event))
+        await self.forward(event)
     
     async def invitation_cancelled(self, event):
-        await self.send(text_data=json.dumps(event))
+        await self.forward(event)
     
     # Helper methods
     async def send_error(self, message: str):
         """Wysyła błąd do klienta"""
-        await self.send(text_data=json.dumps({
+        await self.send_message({
             'type': 'error',
             'message': message
-        }))
+        })
     
     async def validate_player_creatures(self, creature_ids: List[int]) -> bool:
         """Sprawdza czy gracz posiada podane creatures"""
@@ -372,23 +376,28 @@ class GlobalNotificationsConsumer(AsyncWebsocketConsumer):
         except:
             return False
     
+    @staticmethod
+    def create_invitation_battle(invitation, receiver_creatures: List[int]):
+        """Tworzy i od razu zapełnia walkę z zaproszenia; None, gdy dołączenie się nie powiodło.
+
+        Jedna transakcja - walka nigdy nie trafia na listę otwartych walk, więc
+        nikt obcy nie zajmie miejsca zaproszonego gracza (jak w create_ranked_battle).
+        """
+        with transaction.atomic():
+            battle = BattleMatchmaker.create_battle(invitation.sender, invitation.invitation_type)
+            joined = BattleMatchmaker.join_battle(
+                battle, invitation.receiver, invitation.sender_creatures, receiver_creatures
+            )
+            if not joined:
+                transaction.set_rollback(True)
+                return None
+        return battle
+    
     async def get_battle_start_data(self, battle):
-        """Pobiera dane do rozpoczęcia walki"""
-        participants = await database_sync_to_async(lambda: list(
-            battle.participants.all().select_related('creature', 'player__user')
-        ))()
-        
-        participants_data = []
-        for p in participants:
-            participants_data.append({
-                'creature_id': p.creature.id,
-                'name': p.creature.name,
-                'max_hp': p.creature.max_hp,
-                'current_hp': p.current_hp,
-                'initiative': p.creature.initiative,
-                'team': p.team,
-                'player_name': p.player.user.username
-            })
+        """Pobiera dane do rozpoczęcia walki (uczestnicy ze stanu walki, jak w battle_started)"""
+        participants_data = await database_sync_to_async(
+            lambda: get_battle_state(battle).participants_data()
+        )()
         
         return {
             'battle_id': str(battle.id),
@@ -0,0 +1,115 @@
+"""Lista otwartych walk (czekających na drugiego gracza) w pamięci procesu.
+
+Zamiast odpytywać OpenBattlesView, klient subskrybuje ws/battles/open/:
+dostaje raz aktualną listę (`open_battles`), a potem tylko zmiany
+(`open_battle_added` / `open_battle_removed`) wysyłane, gdy walka zostaje
+utworzona, zapełniona albo porzucona. Zmiany są ogłaszane po commicie
+transakcji (transaction.on_commit), więc lista nie pokazuje walk wycofanych
+rollbackiem.
+
+Indeks ładuje się z bazy przy pierwszej subskrypcji (jedno zapytanie),
+potem aktualizują go tylko te zmiany. Zmiana może dojść tuż po liście,
+która już ją zawiera - klient traktuje add/remove idempotentnie (po battle_id).
+
+Jak w OpenBattlesView, subskrybent nie widzi własnych walk: ani w liście,
+ani w `open_battle_added` (zdarzenie niesie player_id twórcy, po którym
+consumer je odfiltrowuje).
+"""
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+
+from .models import Battle
+from .wire import encoded_event
+
+OPEN_BATTLES_GROUP = 'open_battles'
+
+# Maksymalna liczba walk w liście wysyłanej przy subskrypcji (najnowsze)
+SNAPSHOT_LIMIT = 100
+
+
+def battle_entry(battle: Battle) -> dict:
+    """Dane otwartej walki dla klienta"""
+    return {
+        'battle_id': str(battle.id),
+        'battle_type': battle.battle_type,
+        'player_id': battle.player1_id,
+        'player_name': battle.player1.user.username,
+        'created_at': battle.created_at.isoformat(),
+    }
+
+
+class OpenBattleIndex:
+    """Otwarte walki w kolejności utworzenia; wspólne dla wątków procesu (zmiany przychodzą z kodu sync)"""
+
+    def __init__(self):
+        self._battles: Optional[Dict[str, dict]] = None  # None = jeszcze nie załadowany z bazy
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._battles or {})
+
+    def load(self):
+        """Ładuje otwarte walki z bazy (przy pierwszej subskrypcji)"""
+        with self._lock:
+            if self._battles is not None:
+                return
+            battles = Battle.objects.filter(
+                phase='waiting',
+                player2__isnull=True
+            ).select_related('player1__user').order_by('created_at')
+            self._battles = OrderedDict((str(battle.id), battle_entry(battle)) for battle in battles)
+
+    def reset(self):
+        """Zapomina listę - następna subskrypcja załaduje ją z bazy od nowa"""
+        with self._lock:
+            self._battles = None
+
+    def snapshot(self, exclude_player_id=None) -> List[dict]:
+        """Najnowsze otwarte walki (bez walk gracza exclude_player_id)"""
+        self.load()
+        with self._lock:
+            entries = [entry for entry in reversed(self._battles.values())
+                       if entry['player_id'] != exclude_player_id]
+        return entries[:SNAPSHOT_LIMIT]
+
+    def add(self, entry: dict):
+        with self._lock:
+            if self._battles is not None:
+                self._battles[entry['battle_id']] = entry
+
+    def remove(self, battle_id) -> bool:
+        """Usuwa walkę z indeksu; False, gdy indeks wie, że walki w nim nie było"""
+        with self._lock:
+            if self._battles is None:
+                return True
+            return self._battles.pop(str(battle_id), None) is not None
+
+
+# Jeden indeks otwartych walk w procesie
+open_battles = OpenBattleIndex()
+
+
+def _broadcast(message: dict, player_id=None):
+    event = encoded_event(message)
+    if player_id is not None:
+        event['player_id'] = player_id  # twórca walki - jego własny feed ją pomija
+    async_to_sync(get_channel_layer().group_send)(OPEN_BATTLES_GROUP, event)
+
+
+def announce_opened(battle: Battle):
+    """Dodaje walkę do listy i ogłasza subskrybentom (wywoływane po commicie)"""
+    if battle.player2_id is not None or battle.phase != 'waiting':
+        return  # walka zapełniona w tej samej transakcji (np. z kolejki ranked) - nigdy nie była otwarta
+    entry = battle_entry(battle)
+    open_battles.add(entry)
+    _broadcast({'type': 'open_battle_added', 'battle': entry}, entry['player_id'])
+
+
+def announce_closed(battle_id):
+    """Usuwa walkę z listy (zapełniona albo porzucona) i ogłasza subskrybentom"""
+    if open_battles.remove(battle_id):
+        _broadcast({'type': 'open_battle_removed', 'battle_id': str(battle_id)})
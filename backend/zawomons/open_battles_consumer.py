@@ -0,0 +1,64 @@
+from channels.generic.websocket import AsyncWebsocketConsumer
+from channels.db import database_sync_to_async
+from django.contrib.auth.models import AnonymousUser
+from .models import Player
+from .battle_reaper import start_battle_reaper
+from .open_battles import OPEN_BATTLES_GROUP, open_battles
+from .wire import WireCodecMixin
+
+
+class OpenBattlesConsumer(WireCodecMixin, AsyncWebsocketConsumer):
+    """WebSocket z listą otwartych walk: pełna lista raz, potem tylko zmiany (zamiast odpytywania OpenBattlesView)"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.user = None
+        self.player = None
+
+    async def connect(self):
+        """Subskrypcja listy otwartych walk"""
+        # Sprawdź autoryzację
+        self.user = self.scope["user"]
+        if isinstance(self.user, AnonymousUser):
+            await self.close()
+            return
+
+        # Pobierz gracza
+        try:
+            self.player = await database_sync_to_async(Player.objects.get)(user=self.user)
+        except Player.DoesNotExist:
+            await self.close()
+            return
+
+        # Okresowe sprzątanie porzuconych walk (o ile włączone) startuje z pierwszym połączeniem
+        start_battle_reaper()
+
+        # Najpierw grupa, potem lista - żadna zmiana nie przepadnie między nimi
+        await self.channel_layer.group_add(OPEN_BATTLES_GROUP, self.channel_name)
+
+        await self.accept_with_codec()
+        battles = await database_sync_to_async(open_battles.snapshot)(self.player.id)
+        await self.send_message({
+            'type': 'open_battles',
+            'battles': battles
+        })
+
+    async def disconnect(self, close_code):
+        """Koniec subskrypcji"""
+        await self.channel_layer.group_discard(OPEN_BATTLES_GROUP, self.channel_name)
+
+    async def receive(self, text_data=None, bytes_data=None):
+        """Subskrypcja jest tylko do odczytu"""
+        await self.send_message({
+            'type': 'error',
+            'message': 'Open battles feed is read-only'
+        })
+
+    # Event handlers dla zmian listy (zakodowane raz przez nadawcę)
+    async def open_battle_added(self, event):
+        # Własne walki nie trafiają do feedu, tak jak do listy z connect()
+        if event.get('player_id') != self.player.id:
+            await self.forward(event)
+
+    async def open_battle_removed(self, event):
+        await self.forward(event)
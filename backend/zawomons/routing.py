@@ -2,9 +2,13 @@ from django.urls import re_path
 from . import consumers
 from . import notifications_consumer
 from . import simple_invitation_consumer
+from . import matchmaking_consumer
+from . import open_battles_consumer
 
 websocket_urlpatterns = [
     re_path(r'ws/battle/$', consumers.BattleConsumer.as_asgi()),
     re_path(r'ws/notifications/$', notifications_consumer.GlobalNotificationsConsumer.as_asgi()),
     re_path(r'ws/invitations/$', simple_invitation_consumer.SimpleInvitationConsumer.as_asgi()),
+    re_path(r'ws/matchmaking/$', matchmaking_consumer.MatchmakingConsumer.as_asgi()),
+    re_path(r'ws/battles/open/$', open_battles_consumer.OpenBattlesConsumer.as_asgi()),
 ]
\ No newline at end of file
@@ -1,5 +1,5 @@
 from rest_framework import serializers
-from .models import Player, Creature, Spell, City, CreatureSpell
+from .models import Player, PlayerRating, Creature, Spell, City, CreatureSpell
 
 class SpellSerializer(serializers.ModelSerializer):
     class Meta:
@@ -89,9 +89,14 @@ class PlayerListSerializer(serializers.ModelSerializer):
     is_online = serializers.SerializerMethodField()
 
     def get_creature_count(self, obj):
+        # Lista graczy dolicza liczniki w tym samym zapytaniu (annotate)
+        if hasattr(obj, 'creature_total'):
+            return obj.creature_total
         return obj.creatures.count()
 
     def get_city_count(self, obj):
+        if hasattr(obj, 'city_total'):
+            return obj.city_total
         return obj.cities.count()
 
     def get_is_online(self, obj):
@@ -105,6 +110,15 @@ class PlayerListSerializer(serializers.ModelSerializer):
         model = Player
         fields = ['username', 'experience', 'creature_count', 'city_count', 'is_online']
 
+class PlayerRatingSerializer(serializers.ModelSerializer):
+    """Wiersz rankingu ranked (pozycję `rank` ustawia widok)"""
+    username = serializers.CharField(source='player.user.username', read_only=True)
+    rank = serializers.IntegerField(read_only=True, allow_null=True)
+
+    class Meta:
+        model = PlayerRating
+        fields = ['rank', 'player', 'username', 'rating', 'games_played', 'wins', 'losses', 'draws']
+
 # Serializers dla miast
 class CitySerializer(serializers.ModelSerializer):
     owner_username = serializers.CharField(source='owner.user.username', read_only=True)
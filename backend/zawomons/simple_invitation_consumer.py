@@ -4,10 +4,11 @@ import logging
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
 from django.contrib.auth.models import User
+from djangocore.broadcast import ForwardEventMixin, group_send
 
 logger = logging.getLogger(__name__)
 
-class SimpleInvitationConsumer(AsyncWebsocketConsumer):
+class SimpleInvitationConsumer(ForwardEventMixin, AsyncWebsocketConsumer):
     async def connect(self):
         # Get user from token (simplified)
         self.user = None
@@ -63,13 +64,13 @@ class SimpleInvitationConsumer(AsyncWebsocketConsumer):
         
         # Send invitation to target user
         target_group = f"user_{target_username}"
-        await self.channel_layer.group_send(
+        await group_send(
             target_group,
             {
-                'type': 'invitation_message',
-                'message_type': 'invitation_received',
+                'type': 'invitation_received',
                 'from_username': from_username
-            }
+            },
+            handler='invitation_message'
         )
         
         logger.info(f"Invitation sent from {from_username} to {target_username}")
@@ -83,13 +84,13 @@ class SimpleInvitationConsumer(AsyncWebsocketConsumer):
         
         # Send acceptance back to inviter
         inviter_group = f"user_{from_username}"
-        await self.channel_layer.group_send(
+        await group_send(
             inviter_group,
             {
-                'type': 'invitation_message',
-                'message_type': 'invitation_accepted',
+                'type': 'invitation_accepted',
                 'from_username': accepter_username
-            }
+            },
+            handler='invitation_message'
         )
         
         logger.info(f"Invitation accepted by {accepter_username} for {from_username}")
@@ -103,20 +104,17 @@ class SimpleInvitationConsumer(AsyncWebsocketConsumer):
         
         # Send decline back to inviter
         inviter_group = f"user_{from_username}"
-        await self.channel_layer.group_send(
+        await group_send(
             inviter_group,
             {
-                'type': 'invitation_message',
-                'message_type': 'invitation_declined',
+                'type': 'invitation_declined',
                 'from_username': decliner_username
-            }
+            },
+            handler='invitation_message'
         )
         
         logger.info(f"Invitation declined by {decliner_username} for {from_username}")
 
-    # Handler for group messages
+    # Handler for group messages (already encoded by the sender)
     async def invitation_message(self, event):
-        await self.send(text_data=json.dumps({
-            'type': event['message_type'],
-            'from_username': event['from_username']
-        }))
\ No newline at end of file
+        await self.forward(event)
\ No newline at end of file
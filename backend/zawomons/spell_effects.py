@@ -0,0 +1,52 @@
+from typing import Dict, Optional
+from .battle_core import (
+    EFFECT_DAMAGE, EFFECT_HEAL, TARGET_SELF, TARGET_SINGLE_ENEMY,
+    BASE_HEAL, BASE_SPELL_DAMAGE, SpellEffect,
+)
+from .models import Spell
+
+# Efekty spelli po Spell.spell_id (identyfikator z load_spells)
+SPELL_EFFECTS = {
+    0: {'kind': EFFECT_DAMAGE, 'power': BASE_SPELL_DAMAGE, 'targeting': TARGET_SINGLE_ENEMY, 'energy_cost': 0},  # Basic Attack
+    1: {'kind': EFFECT_HEAL, 'power': BASE_HEAL, 'targeting': TARGET_SELF, 'energy_cost': 0},  # Heal
+}
+
+# Spelle bez własnego wpisu zadają zwykły damage w pojedynczego przeciwnika
+DEFAULT_SPELL_EFFECT = {'kind': EFFECT_DAMAGE, 'power': BASE_SPELL_DAMAGE, 'targeting': TARGET_SINGLE_ENEMY, 'energy_cost': 0}
+
+# Rejestr procesu: klucz główny Spell -> SpellEffect (ładowany raz, jednym zapytaniem)
+_registry: Optional[Dict[int, SpellEffect]] = None
+
+
+def _load_registry() -> Dict[int, SpellEffect]:
+    registry = {}
+    for pk, spell_id, name in Spell.objects.values_list('id', 'spell_id', 'name'):
+        effect = SPELL_EFFECTS.get(spell_id, DEFAULT_SPELL_EFFECT)
+        registry[pk] = SpellEffect(spell_id=pk, name=name, **effect)
+    return registry
+
+
+def get_spell_effects() -> Dict[int, SpellEffect]:
+    """Zwraca rejestr efektów wszystkich spelli"""
+    global _registry
+    if _registry is None:
+        _registry = _load_registry()
+    return _registry
+
+
+def get_spell_effect(spell_pk: Optional[int]) -> Optional[SpellEffect]:
+    """Zwraca efekt spella po kluczu głównym Spell"""
+    if spell_pk is None:
+        return None
+    effect = get_spell_effects().get(spell_pk)
+    if effect is None:
+        # Spell dodany po załadowaniu rejestru - przeładuj raz
+        reset_spell_effects()
+        effect = get_spell_effects().get(spell_pk)
+    return effect
+
+
+def reset_spell_effects():
+    """Unieważnia rejestr (np. po przeładowaniu spelli)"""
+    global _registry
+    _registry = None
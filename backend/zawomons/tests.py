@@ -1,3 +1,589 @@
-from django.test import TestCase
+import asyncio
+import copy
+import json
+from unittest import mock
+from channels.db import database_sync_to_async
+from channels.layers import get_channel_layer
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.contrib.auth import get_user_model
+from django.db import DatabaseError
+from django.test import TestCase, TransactionTestCase, override_settings
+from rest_framework.test import APIClient
+from . import battle_core
+from .battle_actor import (BattleActor, BattleActorError, _actors, close_abandoned_battle, get_battle_actor,
+                           turn_deadlines)
+from .battle_core import EFFECT_HEAL, TARGET_SELF, ParticipantState, SpellEffect
+from .battle_engine import BattleEngine, BattleMatchmaker
+from .battle_reaper import reap_stale_battles
+from .battle_state import drop_battle_state, find_battle_state, get_battle_state
+from .consumers import BattleConsumer
+from .matchmaking import QueueTicket, _on_match
+from .models import (Player, PlayerRating, Creature, CreatureSpell, Spell, Battle, BattleParticipant, BattleAction,
+                     City)
+from .notifications_consumer import GlobalNotificationsConsumer
+from .open_battles import open_battles
+from .routing import websocket_urlpatterns
+from .spell_effects import reset_spell_effects
+from .turn_deadlines import TurnDeadlineScheduler
 
-# Create your tests here.
+
+def make_player(username):
+    return Player.objects.create(user=get_user_model().objects.create(username=username))
+
+
+class BattleTestMixin:
+    """Gracze z creatures znającymi Basic Attack i Heal oraz rozpoczęta walka"""
+
+    def setUp(self):
+        super().setUp()
+        self.attack = Spell.objects.create(spell_id=0, name='Basic Attack', description='')
+        self.heal = Spell.objects.create(spell_id=1, name='Heal', description='')
+        # Rejestr efektów i stan walk są globalne dla procesu - każdy test zaczyna od zera
+        reset_spell_effects()
+        self.battle_ids = []
+
+    def tearDown(self):
+        for battle_id in self.battle_ids:
+            turn_deadlines.cancel(battle_id)
+            drop_battle_state(battle_id)
+        reset_spell_effects()
+        super().tearDown()
+
+    def create_player(self, username, team_size=1, hp=1000):
+        player = make_player(username)
+        creatures = [
+            Creature.objects.create(owner=player, name=f'{username} {slot}', main_element='none',
+                                    max_hp=hp, current_hp=hp, initiative=10 + slot)
+            for slot in range(team_size)
+        ]
+        for creature in creatures:
+            CreatureSpell.objects.create(creature=creature, spell=self.attack)
+            CreatureSpell.objects.create(creature=creature, spell=self.heal)
+        return player, [creature.id for creature in creatures]
+
+    def start_battle(self, team_size=1, hp=1000, storage_mode=None):
+        (player1, team1), (player2, team2) = (
+            self.create_player('p1', team_size, hp), self.create_player('p2', team_size, hp)
+        )
+        battle = BattleMatchmaker.create_battle(player1, 'friendly', storage_mode)
+        self.assertTrue(BattleMatchmaker.join_battle(battle, player2, team1, team2))
+        self.battle_ids.append(battle.id)
+        return battle, (player1, team1), (player2, team2)
+
+    def select_all(self, actor, *sides):
+        for player, creature_ids in sides:
+            for creature_id in creature_ids:
+                actor.select_move(player, creature_id, self.attack.id, None)
+
+
+def legacy_turn(participants, spell_names, rng):
+    """Tura według zasad sprzed battle_core (BattleEngine.execute_turn na modelach), z podanym PRNG"""
+    def is_heal(p):
+        return spell_names[p.selected_spell_id].lower() in ['heal', 'cure', 'restore']
+
+    order = sorted(
+        (p for p in participants.values() if p.is_alive and p.selected_spell_id and p.has_confirmed_move),
+        key=lambda p: (-p.initiative, -p.experience // 100, -p.experience, p.name)
+    )
+    actions = []
+    for counter, caster in enumerate(order, start=1):
+        if caster.selected_target_id:
+            targets = [participants[caster.selected_target_id]]
+        elif is_heal(caster):
+            targets = [caster]
+        else:
+            targets = [p for p in participants.values() if p.team != caster.team and p.is_alive][:1]
+        for target in targets:
+            if is_heal(caster):
+                amount = min(30 + rng.randint(-4, 4), target.max_hp - target.current_hp)
+                amount = max(0, amount)
+                target.current_hp = min(target.max_hp, target.current_hp + amount)
+                actions.append((counter, 'heal_performed', caster.participant_id, target.participant_id, 0, amount))
+            else:
+                total = caster.damage + 25
+                variance = int(total * 0.2)
+                amount = max(1, total + rng.randint(-variance, variance))
+                target.current_hp = max(0, target.current_hp - amount)
+                actions.append((counter, 'damage_dealt', caster.participant_id, target.participant_id, amount, 0))
+    return actions
+
+
+class ResolveTurnTests(TestCase):
+    ATTACK, HEAL = 10, 11
+    spells = {
+        ATTACK: SpellEffect(spell_id=ATTACK, name='Basic Attack'),
+        HEAL: SpellEffect(spell_id=HEAL, name='Heal', kind=EFFECT_HEAL, power=30, targeting=TARGET_SELF),
+    }
+    spell_names = {ATTACK: 'Basic Attack', HEAL: 'Heal'}
+
+    def participants(self):
+        def creature(pid, team, hp, initiative, experience, spell, target=None, damage=25, max_hp=100):
+            return ParticipantState(
+                participant_id=pid, creature_id=pid, player_id=team, team=team, name=f'c{pid}',
+                max_hp=max_hp, current_hp=hp, current_energy=0, damage=damage, initiative=initiative,
+                experience=experience, selected_spell_id=spell, selected_target_id=target, has_confirmed_move=True
+            )
+        return {
+            1: creature(1, 1, 100, 12, 0, self.ATTACK),
+            2: creature(2, 1, 90, 12, 250, self.HEAL),                # ta sama inicjatywa, wyższy level
+            3: creature(3, 2, 20, 15, 0, self.ATTACK, target=2),      # najszybszy, wskazany cel
+            4: creature(4, 2, 40, 10, 0, self.ATTACK, damage=0),      # pierwszy żywy przeciwnik po śmierci 3
+            5: creature(5, 2, 80, 8, 0, None),                        # bez ruchu
+        }
+
+    def test_matches_legacy_rules(self):
+        for seed in range(200):
+            legacy = self.participants()
+            expected = legacy_turn(legacy, self.spell_names, battle_core.turn_rng(seed, 0))
+
+            current = self.participants()
+            results = battle_core.resolve_turn(current, self.spells, battle_core.turn_rng(seed, 0))
+            actual = [(r.action_order, r.action_type, r.caster_id, r.target_id, r.damage_amount, r.heal_amount)
+                      for r in results]
+
+            self.assertEqual(actual, expected, f"seed {seed}")
+            self.assertEqual({pid: p.current_hp for pid, p in current.items()},
+                             {pid: p.current_hp for pid, p in legacy.items()})
+
+    def test_damage_and_heal_bounds(self):
+        caster = self.participants()[1]
+        target = self.participants()[2]
+        rng = battle_core.turn_rng(0, 0)
+        for _ in range(500):
+            self.assertTrue(40 <= battle_core.calculate_damage(caster, target, self.spells[self.ATTACK], rng) <= 60)
+            self.assertTrue(0 <= battle_core.calculate_heal(caster, target, self.spells[self.HEAL], rng) <= 10)
+
+        weak = copy.copy(caster)
+        weak.damage = -25
+        self.assertEqual(battle_core.calculate_damage(weak, target, self.spells[self.ATTACK], rng), 1)
+
+    def test_same_seed_same_turn(self):
+        first, second = self.participants(), self.participants()
+        results = [
+            battle_core.resolve_turn(participants, self.spells, battle_core.turn_rng(7, 3))
+            for participants in (first, second)
+        ]
+        self.assertEqual(results[0], results[1])
+
+
+class ExecuteTurnTests(BattleTestMixin, TestCase):
+    def test_failed_commit_drops_state(self):
+        # Tura rozstrzygnięta w pamięci, ale nie zapisana - stan nie może wyprzedzać bazy
+        battle, side1, side2 = self.start_battle()
+        actor = BattleActor(battle.id)
+        self.select_all(actor, side1, side2)
+        actor.confirm_ready(side1[0])
+
+        with mock.patch.object(BattleEngine, 'commit_turn', side_effect=DatabaseError):
+            with self.assertRaises(DatabaseError):
+                actor.confirm_ready(side2[0])
+        self.assertIsNone(find_battle_state(battle.id))
+
+        battle.refresh_from_db()
+        state = get_battle_state(battle)
+        self.assertEqual(state.current_turn, 0)
+        self.assertTrue(all(p.current_hp == 1000 for p in state.participants.values()))
+
+
+class ReplayTests(BattleTestMixin, TestCase):
+    def play_turns(self, battle, sides, turns):
+        actor = BattleActor(battle.id)
+        for _ in range(turns):
+            for player, creature_ids in sides:
+                for creature_id in creature_ids:
+                    actor.select_move(player, creature_id, self.attack.id, None)
+                actor.confirm_ready(player)
+
+    def test_replay_reproduces_stored_state(self):
+        battle, side1, side2 = self.start_battle(team_size=2, storage_mode='replay')
+        self.play_turns(battle, (side1, side2), 3)
+        battle.refresh_from_db()
+
+        self.assertEqual(battle.turn_records.count(), 3)
+        self.assertFalse(BattleAction.objects.filter(battle=battle).exists())
+        self.assertTrue(BattleEngine.verify_battle(battle))
+
+        # Odtworzenie jest deterministyczne
+        replays = [BattleEngine.replay_battle(battle)[0] for _ in range(2)]
+        self.assertEqual(
+            *[[(a.turn_number, a.action_order, a.caster_id, a.target_id, a.damage_amount) for a in actions]
+              for actions in replays]
+        )
+        self.assertEqual(len(replays[0]), 3 * 4)
+
+    def test_verify_detects_tampered_hp(self):
+        battle, side1, side2 = self.start_battle(storage_mode='replay')
+        self.play_turns(battle, (side1, side2), 2)
+        battle.refresh_from_db()
+
+        BattleParticipant.objects.filter(battle=battle, team=1).update(current_hp=1000)
+        self.assertFalse(BattleEngine.verify_battle(battle))
+
+
+class JoinBattleTests(BattleTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.player1, self.team1 = self.create_player('p1')
+        self.player2, self.team2 = self.create_player('p2')
+        self.player3, self.team3 = self.create_player('p3')
+        self.battle = BattleMatchmaker.create_battle(self.player1, 'friendly')
+        self.battle_ids.append(self.battle.id)
+
+    def test_concurrent_join_has_one_winner(self):
+        # Drugi join widzi ten sam (nieaktualny) obiekt walki co pierwszy
+        stale = Battle.objects.get(id=self.battle.id)
+        self.assertTrue(BattleMatchmaker.join_battle(self.battle, self.player2, self.team1, self.team2))
+        self.assertFalse(BattleMatchmaker.join_battle(stale, self.player3, self.team1, self.team3))
+
+        self.battle.refresh_from_db()
+        self.assertEqual(self.battle.player2_id, self.player2.id)
+        self.assertEqual(
+            sorted(BattleParticipant.objects.filter(battle=self.battle).values_list('player_id', flat=True)),
+            sorted([self.player1.id, self.player2.id])
+        )
+
+    def test_cannot_join_cancelled_battle(self):
+        stale = Battle.objects.get(id=self.battle.id)
+        self.assertTrue(BattleMatchmaker.cancel_battle(self.battle, self.player1))
+        self.assertFalse(BattleMatchmaker.join_battle(stale, self.player2, self.team1, self.team2))
+
+        self.battle.refresh_from_db()
+        self.assertEqual(self.battle.phase, 'finished')
+        self.assertIsNone(self.battle.player2_id)
+        self.assertFalse(BattleParticipant.objects.filter(battle=self.battle).exists())
+
+
+class SelectMoveTests(BattleTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.battle, (self.player1, self.team1), (self.player2, self.team2) = self.start_battle()
+        self.actor = BattleActor(self.battle.id)
+
+    def test_accepts_numeric_strings(self):
+        reply = self.actor.select_move(self.player1, str(self.team1[0]), str(self.attack.id), str(self.team2[0]))
+        self.assertEqual(
+            (reply['creature_id'], reply['spell_id'], reply['target_id']),
+            (self.team1[0], self.attack.id, self.team2[0])
+        )
+        participant = BattleParticipant.objects.get(battle=self.battle, creature_id=self.team1[0])
+        self.assertEqual(participant.selected_spell_id, self.attack.id)
+        self.assertEqual(participant.selected_target.creature_id, self.team2[0])
+
+    def test_rejects_invalid_ids(self):
+        for creature_id, spell_id, target_id, message in (
+            ('x', self.attack.id, None, "Invalid creature_id"),
+            (self.team1[0], None, None, "Invalid spell_id"),
+            (self.team1[0], self.attack.id, [1], "Invalid target_id"),
+        ):
+            with self.assertRaisesMessage(BattleActorError, message):
+                self.actor.select_move(self.player1, creature_id, spell_id, target_id)
+
+    def test_rejects_unknown_target(self):
+        with self.assertRaisesMessage(BattleActorError, "Target is not in this battle"):
+            self.actor.select_move(self.player1, self.team1[0], self.attack.id, 999999)
+        participant = BattleParticipant.objects.get(battle=self.battle, creature_id=self.team1[0])
+        self.assertIsNone(participant.selected_spell_id)
+
+
+class TurnTimeoutTests(BattleTestMixin, TestCase):
+    def test_stale_timeout_does_not_execute_next_turn(self):
+        # Termin tury 0 przychodzi do aktora już po tym, jak tura 0 wykonała się z confirm_ready
+        battle, side1, side2 = self.start_battle()
+        actor = BattleActor(battle.id)
+        self.select_all(actor, side1, side2)
+        actor.confirm_ready(side1[0])
+        self.assertEqual(actor.confirm_ready(side2[0])['type'], 'turn_results')
+
+        self.assertIsNone(actor.resolve_turn_timeout(0))
+        battle.refresh_from_db()
+        self.assertEqual(battle.current_turn, 1)
+
+    def test_current_timeout_executes_turn(self):
+        battle, side1, side2 = self.start_battle()
+        actor = BattleActor(battle.id)
+        self.select_all(actor, side1)
+
+        event = actor.resolve_turn_timeout(0)
+        self.assertEqual(event['type'], 'turn_results')
+        self.assertEqual(event['turn_number'], 0)
+        battle.refresh_from_db()
+        self.assertEqual(battle.current_turn, 1)
+
+    def test_loading_state_arms_current_turn_deadline(self):
+        # Walka wczytana po restarcie serwera - terminy w pamięci przepadły
+        battle, side1, side2 = self.start_battle()
+        actor = BattleActor(battle.id)
+        self.assertEqual(actor.get_state().current_turn, 0)
+
+        async def arm():
+            actor.arm_loaded_state()
+            armed = turn_deadlines.deadline(battle.id) is not None
+            turn_deadlines.cancel(battle.id)
+            return armed
+
+        self.assertTrue(asyncio.run(arm()))
+        self.assertFalse(actor.state_loaded)
+
+    def test_scheduler_reports_turn_of_deadline(self):
+        expired = []
+
+        async def run():
+            scheduler = TurnDeadlineScheduler(lambda battle_id, turn: expired.append((battle_id, turn)))
+            scheduler.schedule('a', 0.05, turn=0)
+            scheduler.schedule('a', 0.01, turn=1)  # przesunięty termin należy już do tury 1
+            scheduler.schedule('b', 0.02, turn=4)
+            await asyncio.sleep(0.1)
+
+        asyncio.run(run())
+        self.assertEqual(expired, [('a', 1), ('b', 4)])
+
+
+def with_user(app, user):
+    """Aplikacja ASGI z zalogowanym użytkownikiem w scope (zamiast AuthMiddlewareStack)"""
+    async def inject(scope, receive, send):
+        return await app({**scope, 'user': user}, receive, send)
+    return inject
+
+
+async def wait_until(predicate, timeout=2.0):
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while not predicate() and loop.time() < deadline:
+        await asyncio.sleep(0.01)
+    return predicate()
+
+
+@override_settings(BATTLE_TURN_TIMEOUT=60)
+class TurnClockTests(BattleTestMixin, TransactionTestCase):
+    """Termin pierwszej tury biegnie od rozpoczęcia walki, nawet gdy nikt nic nie wysyła"""
+
+    def test_ws_join_arms_first_deadline(self):
+        player1, team1 = self.create_player('p1')
+        player2, team2 = self.create_player('p2')
+        battle = BattleMatchmaker.create_battle(player1, 'friendly')
+        self.battle_ids.append(battle.id)
+
+        async def join():
+            app = with_user(URLRouter(websocket_urlpatterns), player2.user)
+            communicator = WebsocketCommunicator(app, '/ws/battle/')
+            await communicator.connect()
+            await communicator.receive_from()
+            await communicator.send_to(json.dumps({
+                'type': 'join_battle', 'battle_id': str(battle.id),
+                'team_creatures': team2, 'opponent_creatures': team1
+            }))
+            started = json.loads(await communicator.receive_from())
+            armed = await wait_until(lambda: turn_deadlines.deadline(battle.id) is not None)
+            await communicator.disconnect()
+            return started['type'], armed
+
+        self.assertEqual(asyncio.run(join()), ('battle_started', True))
+
+    def test_ranked_match_arms_first_deadline(self):
+        player1, team1 = self.create_player('p1')
+        player2, team2 = self.create_player('p2')
+        tickets = [QueueTicket(player=Player.objects.select_related('user').get(id=player.id),
+                               channel_name=f'test.{player.id}', team_creatures=team, rating=1000)
+                   for player, team in ((player1, team1), (player2, team2))]
+
+        async def match():
+            await _on_match(*tickets)
+            battle = await Battle.objects.aget(player1=player1)
+            self.battle_ids.append(battle.id)
+            return await wait_until(lambda: turn_deadlines.deadline(battle.id) is not None)
+
+        self.assertTrue(asyncio.run(match()))
+
+
+class BattleStartDataTests(BattleTestMixin, TransactionTestCase):
+    def test_start_data_matches_state(self):
+        # battle_started, zaproszenie, resume i spectate pokazują tę samą inicjatywę (z bonusem walki)
+        battle, side1, side2 = self.start_battle()
+        BattleParticipant.objects.filter(battle=battle, team=1).update(initiative_bonus=5)
+
+        async def start_data():
+            return (await BattleConsumer().get_battle_participants_data(battle),
+                    (await GlobalNotificationsConsumer().get_battle_start_data(battle))['participants'])
+
+        started, invited = asyncio.run(start_data())
+        expected = BattleActor(battle.id).get_state().participants_data()
+        self.assertEqual(started, expected)
+        self.assertEqual(invited, expected)
+        self.assertEqual([p['initiative'] for p in started], [15, 10])
+
+
+@override_settings(BATTLE_TURN_TIMEOUT=60)
+class BattleActorTests(BattleTestMixin, TransactionTestCase):
+    def test_concurrent_confirms_execute_turn_once(self):
+        battle, side1, side2 = self.start_battle(team_size=2)
+        self.select_all(BattleActor(battle.id), side1, side2)
+
+        async def confirm_all():
+            channel_layer = get_channel_layer()
+            channel = await channel_layer.new_channel()
+            await channel_layer.group_add(f'battle_{battle.id}', channel)
+
+            # Obaj gracze potwierdzają jednocześnie (każdy dwa razy) - aktor obsługuje wiadomości po kolei
+            actor = get_battle_actor(battle.id)
+            await asyncio.gather(*(actor.ask('confirm_ready', player) for player in (side1[0], side2[0]) * 2))
+
+            events = []
+            while True:
+                try:
+                    events.append((await asyncio.wait_for(channel_layer.receive(channel), 0.1))['type'])
+                except asyncio.TimeoutError:
+                    return events
+
+        events = asyncio.run(confirm_all())
+        self.assertEqual(events.count('turn_results'), 1)
+        battle.refresh_from_db()
+        self.assertEqual(battle.current_turn, 1)
+
+
+@override_settings(BATTLE_TURN_TIMEOUT=60)
+class BattleReaperTests(BattleTestMixin, TransactionTestCase):
+    def test_reaped_battle_is_announced_and_actor_stops(self):
+        battle, side1, side2 = self.start_battle()
+
+        async def reap():
+            channel_layer = get_channel_layer()
+            channel = await channel_layer.new_channel()
+            await channel_layer.group_add(f'battle_{battle.id}', channel)
+            actor = get_battle_actor(battle.id)
+            await actor.ask('sync_request', side1[0])
+
+            reaped = await database_sync_to_async(reap_stale_battles)(waiting_ttl=0, selection_ttl=0)
+            for battle_id in reaped['selection']:
+                await close_abandoned_battle(battle_id)
+            event = await asyncio.wait_for(channel_layer.receive(channel), 1)
+            await asyncio.wait_for(actor.task, 1)
+            return reaped['selection'], event
+
+        reaped, event = asyncio.run(reap())
+        self.assertEqual(reaped, [str(battle.id)])
+        self.assertEqual((event['type'], json.loads(event['text'])['winner']), ('battle_ended', None))
+        self.assertNotIn(str(battle.id), _actors)
+        self.assertIsNone(find_battle_state(battle.id))
+        self.assertIsNone(turn_deadlines.deadline(battle.id))
+
+
+class OpenBattlesFeedTests(BattleTestMixin, TransactionTestCase):
+    def setUp(self):
+        super().setUp()
+        open_battles.reset()
+
+    def tearDown(self):
+        open_battles.reset()
+        super().tearDown()
+
+    def test_feed_skips_own_battles(self):
+        player1, _ = self.create_player('p1')
+        player2, _ = self.create_player('p2')
+        own = BattleMatchmaker.create_battle(player1, 'friendly')
+
+        async def subscribe_and_create():
+            app = URLRouter(websocket_urlpatterns)
+            feeds = [WebsocketCommunicator(with_user(app, player.user), '/ws/battles/open/')
+                     for player in (player1, player2)]
+            snapshots = []
+            for feed in feeds:
+                await feed.connect()
+                snapshots.append([b['battle_id'] for b in json.loads(await feed.receive_from())['battles']])
+
+            battle = await database_sync_to_async(BattleMatchmaker.create_battle)(player1, 'friendly')
+            added = json.loads(await feeds[1].receive_from())
+            own_feed_silent = await feeds[0].receive_nothing(timeout=0.2)
+            for feed in feeds:
+                await feed.disconnect()
+            return snapshots, added['battle']['battle_id'] == str(battle.id), own_feed_silent
+
+        snapshots, added, own_feed_silent = asyncio.run(subscribe_and_create())
+        self.assertEqual(snapshots, [[], [str(own.id)]])
+        self.assertTrue(added)
+        self.assertTrue(own_feed_silent)
+
+
+class PlayersListTests(TestCase):
+    url = '/api/v1/zawomons/players/'
+
+    def setUp(self):
+        self.players = [make_player(f'p{i}') for i in range(3)]
+        for i, player in enumerate(self.players):
+            for slot in range(i):
+                Creature.objects.create(owner=player, name=f'{player.user.username} {slot}', main_element='none')
+        for i in range(2):
+            City.objects.create(posX=i, posY=i, owner=self.players[2], name=f'City {i}')
+        self.client = APIClient(SERVER_NAME='localhost')
+        self.client.force_authenticate(self.players[0].user)
+
+    def test_lists_all_players_with_counts(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        counts = {row['username']: (row['creature_count'], row['city_count']) for row in response.data}
+        # Creatures i miasta tego samego gracza nie mnożą się nawzajem
+        self.assertEqual(counts, {'p0': (0, 0), 'p1': (1, 0), 'p2': (2, 2)})
+
+    def test_limit_and_offset(self):
+        response = self.client.get(self.url, {'limit': 1, 'offset': 1})
+        self.assertEqual(len(response.data), 1)
+
+
+@override_settings(RANKED_ELO_K_FACTOR=32)
+class RatingTests(TestCase):
+    def setUp(self):
+        self.player1, self.player2 = make_player('p1'), make_player('p2')
+        self.battle = Battle.objects.create(
+            battle_type='ranked', phase='selection', player1=self.player1, player2=self.player2
+        )
+
+    def ratings(self):
+        return [PlayerRating.objects.get(player=player) for player in (self.player1, self.player2)]
+
+    def test_first_game_creates_ratings(self):
+        BattleEngine._update_ratings(self.battle, 'team1')
+        first, second = self.ratings()
+        self.assertEqual((first.rating, second.rating), (1016, 984))
+        self.assertEqual((first.games_played, first.wins, first.losses, first.draws), (1, 1, 0, 0))
+        self.assertEqual((second.games_played, second.wins, second.losses, second.draws), (1, 0, 1, 0))
+
+    def test_loss(self):
+        BattleEngine._update_ratings(self.battle, 'team2')
+        self.assertEqual([r.rating for r in self.ratings()], [984, 1016])
+
+    def test_draw_moves_towards_weaker_player(self):
+        PlayerRating.objects.create(player=self.player1, rating=1200, games_played=5, wins=5)
+        BattleEngine._update_ratings(self.battle, 'draw')
+        first, second = self.ratings()
+        # Oczekiwany wynik 1200 vs 1000 to ~0.76, remis kosztuje faworyta round(32 * -0.26) = 8 punktów
+        self.assertEqual((first.rating, second.rating), (1192, 1008))
+        self.assertEqual((first.games_played, first.draws, second.games_played, second.draws), (6, 1, 1, 1))
+
+    def test_battle_without_opponent_is_ignored(self):
+        self.battle.player2 = None
+        BattleEngine._update_ratings(self.battle, 'team1')
+        self.assertFalse(PlayerRating.objects.exists())
+
+
+class LeaderboardTests(TestCase):
+    url = '/api/v1/zawomons/leaderboard/'
+
+    def setUp(self):
+        # Remis ratingu rozstrzyga id gracza (kolejność indeksu)
+        self.players = [make_player(f'p{i}') for i in range(5)]
+        for player, rating in zip(self.players, (1000, 1100, 1000, 900)):
+            PlayerRating.objects.create(player=player, rating=rating)
+        self.client = APIClient(SERVER_NAME='localhost')
+
+    def rank_of(self, player):
+        self.client.force_authenticate(player.user)
+        return self.client.get(self.url + 'me/').data['rank']
+
+    def test_rank_ties_follow_leaderboard_order(self):
+        self.client.force_authenticate(self.players[0].user)
+        board = [(row['username'], row['rank']) for row in self.client.get(self.url).data]
+        self.assertEqual(board, [('p1', 1), ('p0', 2), ('p2', 3), ('p3', 4)])
+        self.assertEqual([self.rank_of(player) for player in self.players[:4]], [2, 1, 3, 4])
+
+    def test_unrated_player_has_no_rank(self):
+        self.assertIsNone(self.rank_of(self.players[4]))
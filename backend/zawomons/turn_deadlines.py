@@ -0,0 +1,83 @@
+import asyncio
+import heapq
+import logging
+from typing import Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class TurnDeadlineScheduler:
+    """Terminy tur wszystkich walk w jednym kopcu, obsługiwane przez jedno zadanie asyncio.
+
+    Przesunięcie albo anulowanie terminu nie usuwa wpisu z kopca - nieaktualne
+    wpisy są pomijane, gdy trafią na szczyt (lazy deletion).
+
+    Termin pamięta numer tury, której dotyczy - on_expired(battle_id, turn)
+    pozwala odrzucić termin tury, która zdążyła się już wykonać.
+    """
+
+    def __init__(self, on_expired: Callable[[str, Optional[int]], None]):
+        self.on_expired = on_expired
+        self._heap: List[Tuple[float, str]] = []
+        self._deadlines: Dict[str, float] = {}  # battle_id -> aktualny termin (czas pętli asyncio)
+        self._turns: Dict[str, Optional[int]] = {}  # battle_id -> tura, której dotyczy termin
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def __len__(self):
+        return len(self._deadlines)
+
+    def schedule(self, battle_id, delay: float, turn: Optional[int] = None):
+        """Ustawia (lub przesuwa) termin tury `turn` walki na `delay` sekund od teraz"""
+        loop = asyncio.get_running_loop()
+        key = str(battle_id)
+        deadline = loop.time() + delay
+        self._deadlines[key] = deadline
+        self._turns[key] = turn
+        heapq.heappush(self._heap, (deadline, key))
+
+        # Kopiec pełen nieaktualnych wpisów - przebuduj z aktualnych terminów
+        if len(self._heap) > 2 * len(self._deadlines) + 64:
+            self._heap = [(when, bid) for bid, when in self._deadlines.items()]
+            heapq.heapify(self._heap)
+
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._task = loop.create_task(self._run())
+        elif self._heap[0] == (deadline, key):
+            # Nowy termin jest najbliższy - obudź zadanie, żeby skróciło sen
+            self._wakeup.set()
+
+    def cancel(self, battle_id):
+        """Usuwa termin walki (np. po jej zakończeniu)"""
+        self._deadlines.pop(str(battle_id), None)
+        self._turns.pop(str(battle_id), None)
+
+    def deadline(self, battle_id) -> Optional[float]:
+        return self._deadlines.get(str(battle_id))
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while self._heap:
+            deadline, key = self._heap[0]
+            if self._deadlines.get(key) != deadline:
+                heapq.heappop(self._heap)
+                continue
+
+            delay = deadline - loop.time()
+            if delay > 0:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            heapq.heappop(self._heap)
+            del self._deadlines[key]
+            turn = self._turns.pop(key, None)
+            try:
+                self.on_expired(key, turn)
+            except Exception:
+                logger.exception(f"Turn deadline handler failed for battle {key}")
+        # Pusty kopiec - zadanie kończy się i wstaje przy następnym schedule()
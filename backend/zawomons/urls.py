@@ -9,12 +9,13 @@ from .views import (ZawomonsPlayersListView,
                    ZawomonsPlayerMeCitiesListView, ZawomonsPlayerMeCityDetailView,
                    ZawomonsPlayerMeCityBuildView, ZawomonsPublicCreaturesListView,
                    ZawomonsPublicCreatureDetailView, ZawomonsPublicCitiesListView,
-                   ZawomonsPublicCityDetailView, ZawomonsPublicSpellsListView)
+                   ZawomonsPublicCityDetailView, ZawomonsPublicSpellsListView,
+                   ZawomonsLeaderboardView, ZawomonsLeaderboardMeView)
 from .battle_urls import battle_urlpatterns
 
 urlpatterns = [
     # --- 1. player endpoints
-    # ✅ GET  /zawomons/players/ - global player list
+    # ✅ GET  /zawomons/players/ - global player list (?limit=&offset=)
     path('players/', ZawomonsPlayersListView.as_view(), name='zawomons-players-list'),
     
     # ✅ GET  /zawomons/players/me/ - pobiera wszystkie dane gracza
@@ -29,6 +30,13 @@ urlpatterns = [
     # ✅ GET  /zawomons/players/<id>/creatures/ - lista stworków innego gracza (do podglądu profilu)
     path('players/<int:player_id>/creatures/', ZawomonsPlayerCreaturesListView.as_view(), name='zawomons-players-creatures'),
     
+    # - ranking walk ranked
+    # ✅ GET  /zawomons/leaderboard/ - top N graczy (?limit=)
+    path('leaderboard/', ZawomonsLeaderboardView.as_view(), name='zawomons-leaderboard'),
+    
+    # ✅ GET  /zawomons/leaderboard/me/ - rating i pozycja gracza
+    path('leaderboard/me/', ZawomonsLeaderboardMeView.as_view(), name='zawomons-leaderboard-me'),
+    
     # - b) me player creature endpoints
     # ✅ GET  /zawomons/players/me/creatures/ - lista stworków gracza
     path('players/me/creatures/', ZawomonsPlayerMeCreaturesListView.as_view(), name='zawomons-players-me-creatures'),
@@ -93,6 +101,10 @@ urlpatterns = [
 # ❌ GET  /zawomons/players/<id>/cities/ - lista miast innego gracza (do podglądu profilu)
 # ❌ GET  /zawomons/players/<id>/battles/ - lista bitew innego gracza (do podglądu profilu)
 
+# - ranking walk ranked (rating Elo aktualizowany po każdej walce ranked)
+# ✅ GET  /zawomons/leaderboard/ - top N graczy rankingu
+# ✅ GET  /zawomons/leaderboard/me/ - rating i pozycja gracza w rankingu
+
 # - b) me player creature endpoints
 # ✅ GET  /zawomons/players/me/creatures/ - lista stworków gracza
 # ✅ GET  /zawomons/players/me/creatures/<id>/ - pobiera dane danego stworka gracza (jeśli należy do gracza)
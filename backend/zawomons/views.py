@@ -2,9 +2,11 @@ from django.shortcuts import get_object_or_404
 from rest_framework import permissions, status
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from .models import Player, Creature, Spell, City
+from django.db.models import Count, IntegerField, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+from .models import Player, PlayerRating, Creature, Spell, City
 from .serializers import (PlayerSerializer,
-                         PlayerListSerializer,
+                         PlayerListSerializer, PlayerRatingSerializer,
                          CreatureSerializer, SpellSerializer,
                          CitySerializer)
 from drf_spectacular.utils import extend_schema
@@ -13,15 +15,43 @@ from datetime import timedelta
 
 # Create your views here.
 
+LEADERBOARD_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+
+def page_param(request, name: str, default: int, maximum: int = MAX_PAGE_SIZE) -> int:
+    """Liczbowy parametr stronicowania z query string, przycięty do [0, maximum]"""
+    try:
+        value = int(request.query_params.get(name, default))
+    except (TypeError, ValueError):
+        value = default
+    return max(0, min(value, maximum))
+
+
+def owned_count(model):
+    """Podzapytanie z liczbą obiektów `model` należących do gracza (bez mnożenia wierszy jak przy dwóch JOIN)"""
+    counts = model.objects.filter(owner=OuterRef('pk')).order_by().values('owner').annotate(total=Count('id'))
+    return Coalesce(Subquery(counts.values('total'), output_field=IntegerField()), 0)
+
 # --- 1. player endpoints
 class ZawomonsPlayersListView(APIView):
-    """GET: Lista wszystkich graczy gry Zawomons"""
+    """GET: Lista wszystkich graczy gry Zawomons (opcjonalnie strona ?limit=&offset=)"""
     permission_classes = [permissions.IsAuthenticated]
 
     @extend_schema(responses=PlayerListSerializer(many=True))
     def get(self, request):
         try:
-            players = Player.objects.all().order_by('-experience')
+            # Liczniki creatures i miast w tym samym zapytaniu zamiast dwóch zapytań na gracza
+            players = Player.objects.select_related('user').annotate(
+                creature_total=owned_count(Creature),
+                city_total=owned_count(City)
+            ).order_by('-experience', 'id')
+
+            offset = page_param(request, 'offset', 0, maximum=2**31)
+            if 'limit' in request.query_params:
+                players = players[offset:offset + page_param(request, 'limit', MAX_PAGE_SIZE)]
+            elif offset:
+                players = players[offset:]
             serializer = PlayerListSerializer(players, many=True)
             return Response(serializer.data, status=status.HTTP_200_OK)
 
@@ -87,6 +117,50 @@ class ZawomonsPlayerDetailView(APIView):
         except Exception as e:
             return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+# --- ranking walk ranked
+class ZawomonsLeaderboardView(APIView):
+    """GET: Top N graczy rankingu ranked (?limit=, domyślnie 50)"""
+    permission_classes = [permissions.IsAuthenticated]
+
+    @extend_schema(responses=PlayerRatingSerializer(many=True))
+    def get(self, request):
+        try:
+            limit = page_param(request, 'limit', LEADERBOARD_SIZE)
+            # Kolejność zgodna z indeksem (-rating, player) - baza czyta tylko N pierwszych wpisów
+            ratings = list(
+                PlayerRating.objects.select_related('player__user').order_by('-rating', 'player')[:limit]
+            )
+            for position, rating in enumerate(ratings, start=1):
+                rating.rank = position
+            serializer = PlayerRatingSerializer(ratings, many=True)
+            return Response(serializer.data, status=status.HTTP_200_OK)
+
+        except Exception as e:
+            return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+class ZawomonsLeaderboardMeView(APIView):
+    """GET: Rating i pozycja gracza w rankingu ranked (rank = null przed pierwszą walką ranked)"""
+    permission_classes = [permissions.IsAuthenticated]
+
+    @extend_schema(responses=PlayerRatingSerializer)
+    def get(self, request):
+        try:
+            player = get_object_or_404(Player.objects.select_related('user'), user=request.user)
+            rating = PlayerRating.objects.filter(player=player).first()
+            if rating is None:
+                rating = PlayerRating(player=player)
+                rating.rank = None
+            else:
+                # Pozycja = liczba graczy przed nami w kolejności indeksu + 1 (zakres indeksu, bez sortowania)
+                rating.rank = PlayerRating.objects.filter(
+                    Q(rating__gt=rating.rating) | Q(rating=rating.rating, player__lt=player.id)
+                ).count() + 1
+            serializer = PlayerRatingSerializer(rating)
+            return Response(serializer.data, status=status.HTTP_200_OK)
+
+        except Exception as e:
+            return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
 # --- b) me player creature endpoints
 class ZawomonsPlayerMeCreaturesListView(APIView):
     """GET: Lista stworków gracza"""
@@ -0,0 +1,161 @@
+"""Kodowanie wiadomości WebSocket (walki i powiadomienia).
+
+Domyślnie wiadomości to JSON w ramkach tekstowych - bez zmian dla obecnych
+klientów. Klient może przy połączeniu wynegocjować kompaktowy format binarny:
+subprotokół WebSocket `zawomons.msgpack.v1` albo `?encoding=msgpack` w URL.
+
+Format kompaktowy (ramki binarne, MessagePack):
+- każda ramka to mapa z tymi samymi kluczami co wersja JSON,
+- `participants` to lista wierszy
+  [creature_id, name, max_hp, current_hp, initiative, team, player_index]
+  plus `players` - lista nazw graczy, do których odnosi się player_index,
+- akcje w `actions` to wiersze
+  [action_type, caster_index, spell_name, damage_amount, heal_amount,
+   target_index, target_hp_after, target_alive_after]
+  gdzie *_index to pozycja uczestnika na liście `participants`
+  z `battle_started` (target_* = None gdy akcja nie ma celu),
+- wiersze stanu w `delta`, `snapshot` i `deltas` ([seq, wiersze]) mają
+  indeks uczestnika zamiast creature_id: [index, current_hp, current_energy, is_alive].
+Nazwy creatures i graczy idą więc przez łącze raz na walkę. Wiadomości od
+klienta mogą być JSON-em albo MessagePackiem z tymi samymi polami co w JSON.
+
+Zdarzenia grupowe (group_send) są kodowane raz przez nadawcę w obu formatach
+(encoded_event, rozszerzenie djangocore.broadcast.encode_event); odbiorcy
+przekazują gotowy tekst albo bajty bez serializacji.
+"""
+import json
+from typing import Dict, List, Optional
+from urllib.parse import parse_qs
+
+import msgpack
+from djangocore.broadcast import ForwardEventMixin, encode_event
+
+CODEC_JSON = 'json'
+CODEC_MSGPACK = 'msgpack'
+
+MSGPACK_SUBPROTOCOL = 'zawomons.msgpack.v1'
+
+PARTICIPANT_FIELDS = ('creature_id', 'name', 'max_hp', 'current_hp', 'initiative', 'team')
+
+
+def negotiate_codec(scope) -> tuple:
+    """Zwraca (codec, subprotokół do zaakceptowania albo None) dla połączenia"""
+    if MSGPACK_SUBPROTOCOL in scope.get('subprotocols', []):
+        return CODEC_MSGPACK, MSGPACK_SUBPROTOCOL
+    query = parse_qs(scope.get('query_string', b'').decode())
+    if query.get('encoding', [CODEC_JSON])[0] == CODEC_MSGPACK:
+        return CODEC_MSGPACK, None
+    return CODEC_JSON, None
+
+
+def decode(text_data: Optional[str] = None, bytes_data: Optional[bytes] = None) -> dict:
+    """Dekoduje wiadomość od klienta (ramka tekstowa JSON albo binarna MessagePack)"""
+    if bytes_data is not None:
+        return msgpack.unpackb(bytes_data)
+    return json.loads(text_data)
+
+
+def roster_index(participants: List[dict]) -> Dict[int, int]:
+    """creature_id -> pozycja uczestnika na liście participants"""
+    return {p['creature_id']: index for index, p in enumerate(participants)}
+
+
+def compact_participants(participants: List[dict]) -> dict:
+    """Uczestnicy jako wiersze, nazwy graczy raz w liście `players`"""
+    players: List[str] = []
+    rows = []
+    for p in participants:
+        if p['player_name'] not in players:
+            players.append(p['player_name'])
+        rows.append([p[field] for field in PARTICIPANT_FIELDS] + [players.index(p['player_name'])])
+    return {'players': players, 'participants': rows}
+
+
+def compact_actions(actions: List[dict], roster: Dict[int, int]) -> List[list]:
+    """Akcje jako wiersze z indeksami uczestników zamiast nazw"""
+    rows = []
+    for action in actions:
+        target = action.get('target')
+        rows.append([
+            action['action_type'],
+            roster.get(action['caster']['creature_id']),
+            action['spell_name'],
+            action['damage_amount'],
+            action['heal_amount'],
+            roster.get(target['creature_id']) if target else None,
+            target['hp_after'] if target else None,
+            target['alive_after'] if target else None,
+        ])
+    return rows
+
+
+def compact_state_rows(rows: List[list], roster: Dict[int, int]) -> List[list]:
+    """Wiersze stanu z indeksem uczestnika zamiast creature_id"""
+    return [[roster.get(row[0])] + row[1:] for row in rows]
+
+
+def compact_message(message: dict, roster: Optional[Dict[int, int]] = None) -> dict:
+    """Wersja kompaktowa wiadomości (participants, actions i wiersze stanu z indeksami)"""
+    compact = dict(message)
+    if 'participants' in message:
+        compact.update(compact_participants(message['participants']))
+    if roster is not None:
+        if 'actions' in message:
+            compact['actions'] = compact_actions(message['actions'], roster)
+        for key in ('delta', 'snapshot'):
+            if key in message:
+                compact[key] = compact_state_rows(message[key], roster)
+        if 'deltas' in message:
+            compact['deltas'] = [[seq, compact_state_rows(rows, roster)] for seq, rows in message['deltas']]
+    if 'battle_data' in message:
+        compact['battle_data'] = compact_message(message['battle_data'])
+    return compact
+
+
+def encoded_event(message: dict, roster: Optional[Dict[int, int]] = None) -> dict:
+    """Zdarzenie dla group_send z wiadomością zakodowaną raz dla wszystkich odbiorców"""
+    if 'participants' in message:
+        roster = roster_index(message['participants'])
+    event = encode_event(message)
+    event['bytes'] = msgpack.packb(compact_message(message, roster))
+    if 'participants' in message:
+        # Odbiorcy zapamiętują kolejność uczestników dla własnych odpowiedzi w formacie kompaktowym
+        event['roster'] = list(roster)
+    return event
+
+
+def encode(message: dict, codec: str, roster: Optional[Dict[int, int]] = None):
+    """Koduje wiadomość: str (ramka tekstowa) dla JSON, bytes (ramka binarna) dla MessagePack"""
+    if codec == CODEC_MSGPACK:
+        return msgpack.packb(compact_message(message, roster))
+    return json.dumps(message)
+
+
+class WireCodecMixin(ForwardEventMixin):
+    """Negocjacja formatu przy połączeniu i wysyłanie wiadomości w wybranym formacie"""
+
+    codec = CODEC_JSON
+    # Indeksy uczestników walki (z battle_started) dla kompaktowych akcji
+    roster: Optional[Dict[int, int]] = None
+
+    async def accept_with_codec(self):
+        self.codec, subprotocol = negotiate_codec(self.scope)
+        await self.accept(subprotocol=subprotocol)
+
+    async def forward(self, event: dict):
+        """Przekazuje zdarzenie zakodowane przez nadawcę (bez ponownej serializacji)"""
+        if 'roster' in event:
+            self.roster = {creature_id: index for index, creature_id in enumerate(event['roster'])}
+        if self.codec == CODEC_MSGPACK:
+            await self.send(bytes_data=event['bytes'])
+        else:
+            await super().forward(event)
+
+    async def send_message(self, message: dict):
+        if 'participants' in message:
+            self.roster = roster_index(message['participants'])
+        data = encode(message, self.codec, self.roster)
+        if isinstance(data, bytes):
+            await self.send(bytes_data=data)
+        else:
+            await self.send(text_data=data)
@@ -2,13 +2,14 @@ import json
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
 from django.contrib.auth import get_user_model
+from djangocore.broadcast import ForwardEventMixin, group_send, group_send_sync
 from .models import Lobby, LobbyPlayer
 from .serializers import LobbySerializer
 
 User = get_user_model()
 
 
-class LobbyConsumer(AsyncWebsocketConsumer):
+class LobbyConsumer(ForwardEventMixin, AsyncWebsocketConsumer):
     async def connect(self):
         self.lobby_code = self.scope['url_route']['kwargs']['lobby_code']
         self.lobby_group_name = f'lobby_{self.lobby_code}'
@@ -80,64 +81,48 @@ class LobbyConsumer(AsyncWebsocketConsumer):
         
         if success:
             lobby_data = await self.get_lobby_data()
-            await self.channel_layer.group_send(
+            await group_send(
                 self.lobby_group_name,
                 {
-                    'type': 'lobby_update',
+                    'type': 'lobby_state',
                     'lobby': lobby_data
-                }
+                },
+                handler='lobby_update'
             )
 
     async def handle_chat_message(self, data):
         message = data.get('message', '')
         username = data.get('username', 'Guest')
         
-        await self.channel_layer.group_send(
+        await group_send(
             self.lobby_group_name,
             {
-                'type': 'chat_message',
+                'type': 'chat',
                 'message': message,
                 'username': username
-            }
+            },
+            handler='chat_message'
         )
 
+    # Group events carry the client message already encoded by the sender
     async def lobby_update(self, event):
-        await self.send(text_data=json.dumps({
-            'type': 'lobby_state',
-            'lobby': event['lobby']
-        }))
+        await self.forward(event)
 
     async def chat_message(self, event):
-        await self.send(text_data=json.dumps({
-            'type': 'chat',
-            'message': event['message'],
-            'username': event['username']
-        }))
+        await self.forward(event)
 
     async def player_joined(self, event):
-        await self.send(text_data=json.dumps({
-            'type': 'player_joined',
-            'player': event['player']
-        }))
+        await self.forward(event)
 
     async def player_left(self, event):
-        await self.send(text_data=json.dumps({
-            'type': 'player_left',
-            'player_id': event['player_id']
-        }))
+        await self.forward(event)
 
     async def game_started(self, event):
-        await self.send(text_data=json.dumps({
-            'type': 'game_started',
-            'lobby': event['lobby']
-        }))
+        await self.forward(event)
 
     async def lobby_closed(self, event):
         """Handle lobby closure notification"""
-        await self.send(text_data=json.dumps({
-            'type': 'lobby_closed',
-            'reason': event.get('reason', 'Lobby was closed')
-        }))
+        await self.forward(event)
 
     @database_sync_to_async
     def get_lobby_data(self):
@@ -212,10 +197,7 @@ class LobbyConsumer(AsyncWebsocketConsumer):
                 
                 # If creator left, notify remaining players before deleting
                 if is_creator and remaining_players > 0:
-                    from channels.layers import get_channel_layer
-                    from asgiref.sync import async_to_sync
-                    channel_layer = get_channel_layer()
-                    async_to_sync(channel_layer.group_send)(
+                    group_send_sync(
                         f'lobby_{self.lobby_code}',
                         {
                             'type': 'lobby_closed',
@@ -227,16 +209,13 @@ class LobbyConsumer(AsyncWebsocketConsumer):
             else:
                 print(f'👥 Lobby {self.lobby_code} still has {remaining_players} players')
                 # Notify remaining players about the update
-                from channels.layers import get_channel_layer
-                from .serializers import LobbySerializer
-                channel_layer = get_channel_layer()
-                from asgiref.sync import async_to_sync
-                async_to_sync(channel_layer.group_send)(
+                group_send_sync(
                     f'lobby_{self.lobby_code}',
                     {
-                        'type': 'lobby_update',
+                        'type': 'lobby_state',
                         'lobby': LobbySerializer(lobby).data
-                    }
+                    },
+                    handler='lobby_update'
                 )
                 
         except Lobby.DoesNotExist:
@@ -5,8 +5,7 @@ from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from django.utils.crypto import get_random_string
 from django.utils import timezone
-from channels.layers import get_channel_layer
-from asgiref.sync import async_to_sync
+from djangocore.broadcast import group_send_sync
 from .models import Lobby, LobbyPlayer, GameMode, LobbyStatus
 from .serializers import (
     LobbySerializer, CreateLobbySerializer, 
@@ -132,18 +131,19 @@ class LobbyViewSet(viewsets.ModelViewSet):
             guest_username=guest_username if not user else None
         )
 
-        # Notify WebSocket group about new player
-        channel_layer = get_channel_layer()
-        async_to_sync(channel_layer.group_send)(
+        # Notify WebSocket group about new player (serialized once for the group and the response)
+        lobby_data = LobbySerializer(lobby).data
+        group_send_sync(
             f'lobby_{code}',
             {
-                'type': 'lobby_update',
-                'lobby': LobbySerializer(lobby).data
-            }
+                'type': 'lobby_state',
+                'lobby': lobby_data
+            },
+            handler='lobby_update'
         )
 
         return Response(
-            LobbySerializer(lobby).data,
+            lobby_data,
             status=status.HTTP_200_OK
         )
 
@@ -177,8 +177,7 @@ class LobbyViewSet(viewsets.ModelViewSet):
         if first_player and first_player.id == player.id:
             # Creator is leaving - notify other players before deleting
             if lobby.players.count() > 1:
-                channel_layer = get_channel_layer()
-                async_to_sync(channel_layer.group_send)(
+                group_send_sync(
                     f'lobby_{code}',
                     {
                         'type': 'lobby_closed',
@@ -194,13 +193,13 @@ class LobbyViewSet(viewsets.ModelViewSet):
         player.delete()
         
         # Notify WebSocket group about player leaving
-        channel_layer = get_channel_layer()
-        async_to_sync(channel_layer.group_send)(
+        group_send_sync(
             f'lobby_{code}',
             {
-                'type': 'lobby_update',
+                'type': 'lobby_state',
                 'lobby': LobbySerializer(lobby).data
-            }
+            },
+            handler='lobby_update'
         )
         
         return Response({'message': 'Left lobby'}, status=status.HTTP_200_OK)